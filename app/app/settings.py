@@ -35,6 +35,8 @@ ALLOWED_HOSTS = ["127.0.0.1", "localhost", "8832-188-0-179-70.ngrok-free.app"]
 # Application definition
 
 INSTALLED_APPS = [
+    # ASGI runserver, so progress events are streamed
+    "daphne",
     "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
@@ -227,12 +229,70 @@ SOCIALACCOUNT_PROVIDERS = {
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
 
+# Redis used for counters and shared state, the broker one by default
+REDIS_URL = os.getenv("REDIS_URL", CELERY_BROKER_URL)
+
+# Cache shared by web and Celery processes, so invalidation reaches them all
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    }
+}
+
+# Time (s) subscription state is cached for, changes invalidate it earlier
+SUBSCRIPTION_CACHE_TTL = int(os.getenv("SUBSCRIPTION_CACHE_TTL", 60))
+
+# Videojobs are routed to separate queues by kind, other tasks go to the
+# default one. Workers of each queue are scaled separately
+CELERY_TASK_DEFAULT_QUEUE = "default"
+AUDIO_QUEUE = "audio"
+VISUAL_QUEUE = "visual"
+LONG_QUEUE = "long"
+
+# Videojobs estimated to take longer than that (s) go to LONG_QUEUE
+LONG_JOB_MIN_COST = int(os.getenv("LONG_JOB_MIN_COST", 900))
+
+# Admission control. Videojobs are started while estimated cost (s) of
+# running ones fits into global and per-user budgets, others are deferred
+# in FIFO order up to queue limits and rejected with 429 beyond them
+ADMISSION_BUDGET = int(os.getenv("ADMISSION_BUDGET", 7200))
+ADMISSION_USER_BUDGET = int(os.getenv("ADMISSION_USER_BUDGET", 1800))
+ADMISSION_MAX_DEFERRED = int(os.getenv("ADMISSION_MAX_DEFERRED", 200))
+ADMISSION_MAX_USER_DEFERRED = int(os.getenv("ADMISSION_MAX_USER_DEFERRED", 10))
+# Admitted videojob not heard of for that long (s) is taken for lost, like
+# after its worker was killed, and failed to free its budget
+ADMISSION_LEASE = int(os.getenv("ADMISSION_LEASE", 6 * 3600))
+# Processing seconds done per second by all workers, to estimate ETA
+ADMISSION_CAPACITY = float(os.getenv("ADMISSION_CAPACITY", 4))
+
+# Delay (s) before videojob over concurrency of user's plan is retried
+PLAN_LIMIT_RETRY_SECONDS = int(os.getenv("PLAN_LIMIT_RETRY_SECONDS", 30))
+
+# Redis broker emulates priorities 0 (highest) to 9 with a list per step
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
+}
+# Take one task at a time, so queued jobs are reordered by priority
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
 # Celery Beat settings
 CELERY_BEAT_SCHEDULE = {
     "deactivate-expired-subscriptions-daily": {
         "task": "subscriptions.tasks.deactivate_expired_subscriptions",
         "schedule": crontab(hour=0, minute=0),  # Runs daily at midnight
     },
+    "delete-expired-uploads-hourly": {
+        "task": "videojobs.tasks.delete_expired_uploads",
+        "schedule": crontab(minute=0),
+    },
+    # Deferred videojobs are also admitted when running ones complete
+    "admit-deferred-videojobs": {
+        "task": "videojobs.tasks.admit_deferred_videojobs",
+        "schedule": 30.0,
+    },
 }
 
 # Dir to store txt files with ban words
@@ -240,9 +300,88 @@ BAN_WORDS_DIR = os.path.join(STATIC_ROOT, "ban_words")
 
 DETECTION_MODEL_PATH = os.path.join(STATIC_ROOT, "gore-smoking-detector.pt")
 
+# Number of threads used by detection model, 0 means torch default
+DETECTION_NUM_THREADS = int(os.getenv("DETECTION_NUM_THREADS", 0))
+
+# Number of frames passed to detection model at once
+DETECTION_BATCH_SIZE = int(os.getenv("DETECTION_BATCH_SIZE", 4))
+
+# Fraction of box size added around boxes carried over frames skipped by
+# detection, to cover objects moving between detected frames
+DETECTION_BOX_PADDING = float(os.getenv("DETECTION_BOX_PADDING", 0.1))
+
+# How to hide detected regions: `blur`, `pixelate` or `fill`
+OBFUSCATION_METHOD = os.getenv("OBFUSCATION_METHOD", "blur")
+
+# Scan h264 videos with detection on frames downscaled to SCAN_SIZE on larger
+# side first, then re-encode only GOPs with detections and copy the others
+COPY_THROUGH = os.getenv("COPY_THROUGH", "True") == "True"
+DETECTION_SCAN_SIZE = int(os.getenv("DETECTION_SCAN_SIZE", 640))
+
+# Dir to store per-frame detections of processed videos and its max size
+DETECTION_CACHE_DIR = os.path.join("/", "vol", "detection-cache")
+DETECTION_CACHE_MAX_MB = int(os.getenv("DETECTION_CACHE_MAX_MB", 1024))
+
+# Whisper transcription model settings. 0 threads means CTranslate2 default
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "medium")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", 0))
+WHISPER_NUM_WORKERS = int(os.getenv("WHISPER_NUM_WORKERS", 1))
+
+# Audio longer than that (s) is split at silence into chunks transcribed in
+# parallel by WHISPER_NUM_WORKERS. 0 transcribes audio as one stream
+TRANSCRIPTION_CHUNK_SECONDS = int(os.getenv("TRANSCRIPTION_CHUNK_SECONDS", 300))
+
+# Max total size of cached transcripts in MB. Least recently used ones are
+# evicted beyond it
+TRANSCRIPT_CACHE_MAX_MB = int(os.getenv("TRANSCRIPT_CACHE_MAX_MB", 512))
+
+# Min interval (s) between progress writes of a videojob stage to Redis
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", 1))
+
+# Progress event stream of videojob is closed after that (s), clients
+# reconnect. Keepalive comment is sent when no changes for KEEPALIVE (s)
+PROGRESS_EVENTS_TIMEOUT = int(os.getenv("PROGRESS_EVENTS_TIMEOUT", 600))
+PROGRESS_EVENTS_KEEPALIVE = int(os.getenv("PROGRESS_EVENTS_KEEPALIVE", 15))
+
+# Load ML models when Celery worker process starts instead of first job
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "True") == "True"
+
+# Port Celery worker exports Prometheus metrics of videojob stages on, 0
+# disables it. Prefork pools also need PROMETHEUS_MULTIPROC_DIR
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+
 # Dir to store indermediate media files
 TMP_FILES_DIR = os.path.join("/", "tmp-files")
 
+# Dir to store intermediate files shared by workers
+SHARED_TMP_FILES_DIR = os.path.join("/", "vol", "tmp-files")
+
+# Videos longer than that (s) are split into segments of SEGMENT_SECONDS
+# censored by parallel tasks. 0 disables splitting
+SEGMENT_FANOUT_MIN_SECONDS = int(os.getenv("SEGMENT_FANOUT_MIN_SECONDS", 600))
+SEGMENT_SECONDS = int(os.getenv("SEGMENT_SECONDS", 120))
+
+# Send downloaded videos by web server instead of Django worker:
+# "x-accel-redirect" (nginx) or "x-sendfile" (Apache, lighttpd), empty
+# string streams them from Django
+DOWNLOAD_OFFLOAD = os.getenv("DOWNLOAD_OFFLOAD", "")
+# Internal nginx location aliased to MEDIA_ROOT for X-Accel-Redirect
+DOWNLOAD_ACCEL_PREFIX = os.getenv("DOWNLOAD_ACCEL_PREFIX", "/protected-media/")
+
+# Max size (MB) of one chunk of resumable upload
+UPLOAD_CHUNK_MAX_MB = int(os.getenv("UPLOAD_CHUNK_MAX_MB", 64))
+
+# Incomplete uploads not resumed for that (h) are deleted
+UPLOAD_EXPIRE_HOURS = int(os.getenv("UPLOAD_EXPIRE_HOURS", 24))
+
+# Max number of censorship branches (audio, visual) run concurrently per job.
+# 1 runs them one after another
+CENSOR_MAX_WORKERS = int(os.getenv("CENSOR_MAX_WORKERS", 2))
+
+# How to censor ban words in audio: `beep` or `mute`
+AUDIO_CENSOR_MODE = os.getenv("AUDIO_CENSOR_MODE", "beep")
+
 
 # Yookassa settings
 YOOKASSA_ACCOUNT_ID = os.environ.get("YOOKASSA_ACCOUNT_ID")
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.9 on 2026-10-18 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0012_alter_subscription_end_date_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="subplan",
+            name="exhaustive_detection",
+            field=models.BooleanField(
+                blank=True,
+                default=False,
+                help_text="Allow detection on every video frame",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.9 on 2026-10-18 04:35
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0013_subplan_exhaustive_detection"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="subplan",
+            name="priority",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                default=0,
+                help_text="Queue priority of videojobs, 9 is the highest",
+                validators=[django.core.validators.MaxValueValidator(9)],
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.9 on 2026-10-18 04:57
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0014_subplan_priority"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="subplan",
+            name="max_concurrent_jobs",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                help_text="Videojobs processed at once, empty is unlimited",
+                null=True,
+                validators=[django.core.validators.MinValueValidator(1)],
+            ),
+        ),
+        migrations.AddField(
+            model_name="subplan",
+            name="max_video_minutes",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Max duration of input video in minutes, empty is unlimited",
+                null=True,
+                validators=[django.core.validators.MinValueValidator(1)],
+            ),
+        ),
+        migrations.AddField(
+            model_name="subplan",
+            name="monthly_minutes",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Minutes of video processed per month, empty is unlimited",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.9 on 2026-10-18 05:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0015_subplan_limits"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="subscription",
+            index=models.Index(
+                fields=["user", "is_active"], name="subscriptio_user_id_24ff08_idx"
+            ),
+        ),
+    ]
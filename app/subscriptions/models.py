@@ -28,6 +28,34 @@ class SubPlan(models.Model):
         decimal_places=1,
         validators=[MinValueValidator(0), MaxValueValidator(100)],
     )
+    exhaustive_detection = models.BooleanField(
+        default=False,
+        blank=True,
+        help_text="Allow detection on every video frame",
+    )
+    priority = models.PositiveSmallIntegerField(
+        default=0,
+        blank=True,
+        validators=[MaxValueValidator(9)],
+        help_text="Queue priority of videojobs, 9 is the highest",
+    )
+    max_concurrent_jobs = models.PositiveSmallIntegerField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(1)],
+        help_text="Videojobs processed at once, empty is unlimited",
+    )
+    monthly_minutes = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text="Minutes of video processed per month, empty is unlimited",
+    )
+    max_video_minutes = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(1)],
+        help_text="Max duration of input video in minutes, empty is unlimited",
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -54,6 +82,9 @@ class Subscription(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=("user", "is_active"))]
+
     def clean(self):
         # Limit number of active subs per user
         if self.is_active and Subscription.objects.filter(
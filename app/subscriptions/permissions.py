@@ -1,9 +1,9 @@
 import ipaddress
 
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 from rest_framework.permissions import BasePermission
 
-from .models import Payment, Subscription
+from .state import has_active_subscription, is_subscription_paid
 
 
 class HasNoActiveSubscription(BasePermission):
@@ -14,9 +14,7 @@ class HasNoActiveSubscription(BasePermission):
     message = "You already have active subscription"
 
     def has_permission(self, request, view):
-        if Subscription.objects.filter(user=request.user, is_active=True):
-            return False
-        return True
+        return not has_active_subscription(request.user.id)
 
 
 class IsSubscriptionNotPaid(BasePermission):
@@ -27,14 +25,10 @@ class IsSubscriptionNotPaid(BasePermission):
     message = "This subscription is already paid for"
 
     def has_permission(self, request, view):
-        subscription_pk = view.kwargs.get("subscription_pk")
-        subscription = get_object_or_404(Subscription, pk=subscription_pk)
-        if Payment.objects.filter(
-            subscription=subscription,
-            status__in=[Payment.PROCESSING, Payment.COMPLETED],
-        ):
-            return False
-        return True
+        is_paid = is_subscription_paid(view.kwargs.get("subscription_pk"))
+        if is_paid is None:
+            raise Http404
+        return not is_paid
 
 
 class IsYookassaIP(BasePermission):
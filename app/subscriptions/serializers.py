@@ -24,6 +24,11 @@ class SubPlanReadSerializer(SubPlanBriefSerializer):
             "price",
             "yearly_discount",
             "discounted_price",
+            "exhaustive_detection",
+            "priority",
+            "max_concurrent_jobs",
+            "monthly_minutes",
+            "max_video_minutes",
         )
 
     def get_discounted_price(self, obj):
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Payment, SubPlan, Subscription
+from .state import invalidate_payment_state, invalidate_plan, invalidate_users
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def invalidate_subscription_state(sender, instance, **kwargs):
+    """Drop cached state of subscription's user and its payments"""
+    invalidate_users([instance.user_id])
+    invalidate_payment_state(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def invalidate_subscription_payment_state(sender, instance, **kwargs):
+    """Drop cached payment state of payment's subscription"""
+    if instance.subscription_id:
+        invalidate_payment_state(instance.subscription_id)
+
+
+@receiver([post_save, post_delete], sender=SubPlan)
+def invalidate_subscription_plan(sender, instance, **kwargs):
+    """Drop cached plan"""
+    invalidate_plan(instance.pk)
@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from .models import Payment, SubPlan, Subscription
+
+
+def get_active_key(user_id):
+    """Get cache key of user's active subscription state"""
+    return f"subscriptions:user:{user_id}:active"
+
+
+def get_plan_key(plan_id):
+    """Get cache key of subscription plan"""
+    return f"subscriptions:plan:{plan_id}"
+
+
+def get_paid_key(subscription_id):
+    """Get cache key of subscription payment state"""
+    return f"subscriptions:{subscription_id}:paid"
+
+
+def get_active_state(user_id):
+    """
+    Get whether user has active subscription and id of its plan. Cached,
+    so it's read from database once per SUBSCRIPTION_CACHE_TTL at most
+    """
+    key = get_active_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        subscription = (
+            Subscription.objects.filter(user_id=user_id, is_active=True)
+            .values("plan_id")
+            .first()
+        )
+        state = {
+            "is_active": subscription is not None,
+            "plan_id": subscription and subscription["plan_id"],
+        }
+        cache.set(key, state, settings.SUBSCRIPTION_CACHE_TTL)
+    return state
+
+
+def has_active_subscription(user_id):
+    """Check if user has active subscription"""
+    return get_active_state(user_id)["is_active"]
+
+
+def get_active_plan(user_id):
+    """Get plan of user's active subscription, None if there is none"""
+    plan_id = get_active_state(user_id)["plan_id"]
+    if plan_id is None:
+        return None
+    return cache.get_or_set(
+        get_plan_key(plan_id),
+        lambda: SubPlan.objects.filter(pk=plan_id).first(),
+        settings.SUBSCRIPTION_CACHE_TTL,
+    )
+
+
+def is_subscription_paid(subscription_id):
+    """
+    Check if subscription has processing or completed payment. None if
+    there is no such subscription
+    """
+    key = get_paid_key(subscription_id)
+    state = cache.get(key)
+    if state is None:
+        payments = Payment.objects.filter(
+            subscription=OuterRef("pk"),
+            status__in=[Payment.PROCESSING, Payment.COMPLETED],
+        )
+        paid = (
+            Subscription.objects.filter(pk=subscription_id)
+            .annotate(is_paid=Exists(payments))
+            .values_list("is_paid", flat=True)
+            .first()
+        )
+        state = {"is_paid": paid}
+        cache.set(key, state, settings.SUBSCRIPTION_CACHE_TTL)
+    return state["is_paid"]
+
+
+def invalidate_users(user_ids):
+    """Drop cached subscription state of users"""
+    cache.delete_many([get_active_key(user_id) for user_id in user_ids])
+
+
+def invalidate_plan(plan_id):
+    """Drop cached subscription plan"""
+    cache.delete(get_plan_key(plan_id))
+
+
+def invalidate_payment_state(subscription_id):
+    """Drop cached payment state of subscription"""
+    cache.delete(get_paid_key(subscription_id))
@@ -3,10 +3,17 @@ from datetime import date
 from celery import shared_task
 
 from .models import Subscription
+from .state import invalidate_users
 
 
 @shared_task
 def deactivate_expired_subscriptions():
     """Deactivate expired user subscriptions"""
-    expired_subs = Subscription.objects.filter(end_date__lt=date.today())
+    expired_subs = Subscription.objects.filter(
+        end_date__lt=date.today(),
+        is_active=True,
+    )
+    user_ids = list(expired_subs.values_list("user_id", flat=True))
     expired_subs.update(is_active=False)
+    # Bulk update sends no signals
+    invalidate_users(user_ids)
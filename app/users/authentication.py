@@ -0,0 +1,13 @@
+from dj_rest_auth.jwt_auth import JWTCookieAuthentication
+from rest_framework_simplejwt.authentication import \
+    JWTStatelessUserAuthentication
+
+
+class JWTStatelessCookieAuthentication(
+    JWTCookieAuthentication,
+    JWTStatelessUserAuthentication,
+):
+    """
+    Authenticate by JWT from header or cookie without database lookup.
+    `request.user` is a TokenUser backed by the token claims
+    """
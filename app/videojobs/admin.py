@@ -1,7 +1,10 @@
 from django.contrib import admin
 
-from .models import AudioSetting, VideoJob, VideoSetting
+from .models import (AudioSetting, Transcript, VideoJob, VideoSetting,
+                     VideoUpload)
 
 admin.site.register(VideoJob)
 admin.site.register(AudioSetting)
 admin.site.register(VideoSetting)
+admin.site.register(Transcript)
+admin.site.register(VideoUpload)
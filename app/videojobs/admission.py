@@ -0,0 +1,196 @@
+import math
+import time
+
+from django.conf import settings
+
+from .utils import get_redis, get_script
+
+# Deferred videojob ids scored by time they were deferred
+DEFERRED_KEY = "admission:deferred"
+# Videojob id -> `user_id:cost:max_jobs` of deferred and admitted videojobs,
+# max_jobs is concurrency limit of user's plan, 0 if unlimited
+JOBS_KEY = "admission:jobs"
+# User id -> number of deferred videojobs
+USER_DEFERRED_KEY = "admission:user-deferred"
+# Total estimated cost (s) of admitted videojobs
+BACKLOG_KEY = "admission:backlog"
+# User id -> estimated cost (s) of admitted videojobs
+USER_BACKLOG_KEY = "admission:user-backlog"
+# User id -> number of admitted videojobs
+USER_JOBS_KEY = "admission:user-jobs"
+# Admitted videojob ids scored by end of their lease, renewed by its tasks
+ADMITTED_KEY = "admission:admitted"
+
+KEYS = (
+    DEFERRED_KEY,
+    JOBS_KEY,
+    USER_DEFERRED_KEY,
+    BACKLOG_KEY,
+    USER_BACKLOG_KEY,
+    USER_JOBS_KEY,
+    ADMITTED_KEY,
+)
+
+DEFER_SCRIPT = """
+if redis.call("HEXISTS", KEYS[2], ARGV[1]) == 1 then
+    return 1
+end
+redis.call("ZADD", KEYS[1], ARGV[4], ARGV[1])
+local job = table.concat({ARGV[2], ARGV[3], ARGV[5]}, ":")
+redis.call("HSET", KEYS[2], ARGV[1], job)
+redis.call("HINCRBY", KEYS[3], ARGV[2], 1)
+return 1
+"""
+
+# Deferred jobs are admitted in order. Jobs of user over budget or plan's
+# concurrency limit are skipped, so others go on, and the first job over
+# global budget stops admission. Job costing more than budget is admitted
+# when nothing else is running. Admitted jobs get a lease
+ADMIT_SCRIPT = """
+local admitted = {}
+local blocked_users = {}
+local total = tonumber(redis.call("GET", KEYS[4]) or "0")
+for _, id in ipairs(redis.call("ZRANGE", KEYS[1], 0, -1)) do
+    local job = redis.call("HGET", KEYS[2], id)
+    if not job then
+        redis.call("ZREM", KEYS[1], id)
+    else
+        local user, cost, max_jobs = string.match(job, "^(%d+):(%d+):(%d+)$")
+        cost = tonumber(cost)
+        max_jobs = tonumber(max_jobs)
+        local user_total = tonumber(redis.call("HGET", KEYS[5], user) or "0")
+        local user_jobs = tonumber(redis.call("HGET", KEYS[6], user) or "0")
+        if blocked_users[user] or (
+            user_total > 0 and user_total + cost > tonumber(ARGV[2])
+        ) or (max_jobs > 0 and user_jobs >= max_jobs) then
+            blocked_users[user] = true
+        elseif total > 0 and total + cost > tonumber(ARGV[1]) then
+            break
+        else
+            total = total + cost
+            redis.call("INCRBY", KEYS[4], cost)
+            redis.call("HINCRBY", KEYS[5], user, cost)
+            redis.call("HINCRBY", KEYS[6], user, 1)
+            redis.call("ZREM", KEYS[1], id)
+            redis.call("HINCRBY", KEYS[3], user, -1)
+            redis.call("ZADD", KEYS[7], tonumber(ARGV[3]) + tonumber(ARGV[4]), id)
+            table.insert(admitted, id)
+        end
+    end
+end
+return admitted
+"""
+
+RELEASE_SCRIPT = """
+local job = redis.call("HGET", KEYS[2], ARGV[1])
+if not job then
+    return 0
+end
+local user, cost = string.match(job, "^(%d+):(%d+):")
+redis.call("HDEL", KEYS[2], ARGV[1])
+if redis.call("ZREM", KEYS[1], ARGV[1]) == 1 then
+    redis.call("HINCRBY", KEYS[3], user, -1)
+else
+    redis.call("DECRBY", KEYS[4], cost)
+    redis.call("HINCRBY", KEYS[5], user, -cost)
+    redis.call("HINCRBY", KEYS[6], user, -1)
+    redis.call("ZREM", KEYS[7], ARGV[1])
+end
+return 1
+"""
+
+
+def is_queue_full(user_id):
+    """
+    Check if admission queue or user's part of it is full. Checked before
+    videojob is created, so concurrent requests may exceed limits slightly
+    """
+    pipe = get_redis().pipeline()
+    pipe.zcard(DEFERRED_KEY)
+    pipe.hget(USER_DEFERRED_KEY, user_id)
+    deferred, user_deferred = pipe.execute()
+    return (
+        deferred >= settings.ADMISSION_MAX_DEFERRED
+        or int(user_deferred or 0) >= settings.ADMISSION_MAX_USER_DEFERRED
+    )
+
+
+def defer_videojob(video_id, user_id, cost, max_jobs=None):
+    """
+    Put videojob with estimated cost (s) at the end of admission queue. It
+    waits while user has `max_jobs` admitted videojobs
+    """
+    get_script(DEFER_SCRIPT)(
+        keys=KEYS,
+        args=[video_id, user_id, math.ceil(cost), time.time(), max_jobs or 0],
+    )
+
+
+def admit_deferred():
+    """
+    Reserve capacity budgets for deferred videojobs that fit into them and
+    return their ids
+    """
+    admitted = get_script(ADMIT_SCRIPT)(
+        keys=KEYS,
+        args=[
+            settings.ADMISSION_BUDGET,
+            settings.ADMISSION_USER_BUDGET,
+            time.time(),
+            settings.ADMISSION_LEASE,
+        ],
+    )
+    return [int(video_id) for video_id in admitted]
+
+
+def release_videojob(video_id):
+    """Free budgets reserved by videojob or drop it from admission queue"""
+    get_script(RELEASE_SCRIPT)(keys=KEYS, args=[video_id])
+
+
+def renew_lease(video_id):
+    """Extend lease of admitted videojob, so it isn't taken for lost"""
+    lease_end = time.time() + settings.ADMISSION_LEASE
+    get_redis().zadd(ADMITTED_KEY, {video_id: lease_end}, xx=True)
+
+
+def get_admitted():
+    """Get lease end by id of admitted videojobs"""
+    admitted = get_redis().zrange(ADMITTED_KEY, 0, -1, withscores=True)
+    return {int(video_id): lease_end for video_id, lease_end in admitted}
+
+
+def is_known(video_id):
+    """Check if videojob is deferred or admitted"""
+    return get_redis().hexists(JOBS_KEY, video_id)
+
+
+def get_user_jobs(user_id):
+    """Get number of admitted videojobs of user"""
+    return int(get_redis().hget(USER_JOBS_KEY, user_id) or 0)
+
+
+def get_backlog_eta():
+    """Get time (s) admitted videojobs are estimated to take"""
+    backlog = int(get_redis().get(BACKLOG_KEY) or 0)
+    return round(backlog / settings.ADMISSION_CAPACITY)
+
+
+def get_queue_position(video_id):
+    """
+    Get position of deferred videojob in admission queue and ETA (s) of
+    its start from costs of admitted videojobs and ones ahead of it. None
+    if it's not deferred
+    """
+    redis = get_redis()
+    rank = redis.zrank(DEFERRED_KEY, video_id)
+    if rank is None:
+        return None
+
+    cost = int(redis.get(BACKLOG_KEY) or 0)
+    if rank:
+        ahead = redis.zrange(DEFERRED_KEY, 0, rank - 1)
+        jobs = redis.hmget(JOBS_KEY, ahead)
+        cost += sum(int(job.split(b":")[1]) for job in jobs if job)
+    eta = cost / settings.ADMISSION_CAPACITY
+    return {"position": rank + 1, "eta": round(eta)}
@@ -0,0 +1,75 @@
+import numpy as np
+
+# Censoring modes
+BEEP = "beep"
+MUTE = "mute"
+
+BEEP_FREQUENCY = 1000  # Hz
+BEEP_GAIN_DB = -20  # Relative to full scale
+
+# Number of sample frames censored at once when streaming PCM
+BLOCK_FRAMES = 2**16
+
+
+def merge_intervals(intervals):
+    """Sort (start, end) intervals and merge overlapping ones"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def censor_samples(samples, frame_rate, intervals, mode=BEEP, offset=0):
+    """
+    Overwrite sample ranges of merged `intervals` (in seconds) with beep
+    tone or silence. `samples` is a (frames, channels) integer array that
+    is modified in place, `offset` is index of its first frame in the stream
+    """
+    full_scale = np.iinfo(samples.dtype).max
+    amplitude = full_scale * 10 ** (BEEP_GAIN_DB / 20)
+
+    for start, end in merge_intervals(intervals):
+        start_i = max(int(round(start * frame_rate)) - offset, 0)
+        end_i = min(int(round(end * frame_rate)) - offset, len(samples))
+        if start_i >= end_i:
+            continue
+
+        if mode == MUTE:
+            samples[start_i:end_i] = 0
+            continue
+
+        # Tone phase depends on absolute sample index so adjacent
+        # intervals join without clicks
+        t = np.arange(start_i + offset, end_i + offset) / frame_rate
+        tone = amplitude * np.sin(2 * np.pi * BEEP_FREQUENCY * t)
+        samples[start_i:end_i] = tone.astype(samples.dtype)[:, np.newaxis]
+
+    return samples
+
+
+def censor_blocks(blocks, frame_rate, intervals, mode=BEEP):
+    """
+    Censor consecutive (frames, channels) sample blocks of a stream in place
+    and yield them. Only intervals overlapping the block are applied to it
+    """
+    intervals = merge_intervals(intervals)
+    first = 0  # First interval not ended before current block
+    offset = 0
+    for block in blocks:
+        block_start = offset / frame_rate
+        block_end = (offset + len(block)) / frame_rate
+        while first < len(intervals) and intervals[first][1] <= block_start:
+            first += 1
+        overlapping = []
+        for start, end in intervals[first:]:
+            if start >= block_end:
+                break
+            overlapping.append((start, end))
+
+        censor_samples(block, frame_rate, overlapping, mode, offset)
+        offset += len(block)
+        yield block
+
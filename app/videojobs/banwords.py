@@ -0,0 +1,89 @@
+import re
+from functools import lru_cache
+
+import snowballstemmer
+
+STEMMER_LANGUAGES = {"en": "english", "ru": "russian"}
+
+# Trie key marking the end of phrase
+END = None
+
+
+@lru_cache(maxsize=None)
+def get_stemmer(lang):
+    """Get snowball stemmer of language"""
+    return snowballstemmer.stemmer(STEMMER_LANGUAGES[lang])
+
+
+@lru_cache(maxsize=2**16)
+def stem_word(word, lang):
+    """Bring the word to the stem form"""
+    return get_stemmer(lang).stemWord(word)
+
+
+def stem_phrase(phrase, lang):
+    """Split phrase to words and bring them to the stem form"""
+    words = [re.sub(r"[^\w-]", "", w) for w in phrase.lower().split()]
+    return tuple(stem_word(w, lang) for w in words if w)
+
+
+@lru_cache(maxsize=None)
+def load_ban_phrases(filename, lang):
+    """Read ban list file once per process and return its stemmed phrases"""
+    with open(filename, "r", encoding="utf8") as f:
+        return tuple(stem_phrase(line, lang) for line in f if line.strip())
+
+
+class BanWordMatcher:
+    """
+    Match ban words and phrases in transcript word stream. Phrases are
+    compiled into a trie of word stems, so morphological variants of words
+    match too
+    """
+
+    def __init__(self, lang, phrases=(), filenames=()):
+        self.lang = lang
+        self.trie = {}
+        self.size = 0
+
+        for filename in filenames:
+            for stems in load_ban_phrases(filename, lang):
+                self.__add(stems)
+        for phrase in phrases:
+            self.__add(stem_phrase(phrase, lang))
+
+    def __len__(self):
+        return self.size
+
+    def find(self, words):
+        """
+        Find ban phrases in a list of normalized words in one pass and
+        return list of (first, last) word index pairs of matches
+        """
+        stems = [stem_word(w, self.lang) for w in words]
+        matches = []
+        # Trie nodes of partially matched phrases with their first word index
+        active = []
+        for i, stem in enumerate(stems):
+            next_active = []
+            for start, node in active + [(i, self.trie)]:
+                child = node.get(stem)
+                if child is None:
+                    continue
+                if END in child:
+                    matches.append((start, i))
+                if len(child) > (END in child):
+                    next_active.append((start, child))
+            active = next_active
+        return matches
+
+    def __add(self, stems):
+        """Add phrase stems to trie"""
+        if not stems:
+            return
+        node = self.trie
+        for stem in stems:
+            node = node.setdefault(stem, {})
+        if END not in node:
+            node[END] = True
+            self.size += 1
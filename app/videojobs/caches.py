@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+from uuid import uuid4
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Transcript
+from .utils import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Suffix of files being written, other workers leave them alone
+TMP_SUFFIX = ".tmp.npz"
+
+
+class TranscriptCache:
+    """
+    Persistent LRU cache of transcripts keyed by audio stream hash,
+    language and transcriber model
+    """
+
+    HITS_KEY = "transcript_cache:hits"
+    MISSES_KEY = "transcript_cache:misses"
+
+    def __init__(self, max_size_mb=None):
+        self.max_size = (max_size_mb or settings.TRANSCRIPT_CACHE_MAX_MB) * 2**20
+
+    def get(self, audio_hash, language, model_id):
+        """Get cached words or None"""
+        transcript = (
+            Transcript.objects.filter(
+                audio_hash=audio_hash,
+                language=language,
+                model_id=model_id,
+            )
+            .only("id", "words")
+            .first()
+        )
+        if transcript is None:
+            get_redis().incr(self.MISSES_KEY)
+            return None
+
+        get_redis().incr(self.HITS_KEY)
+        Transcript.objects.filter(id=transcript.id).update(
+            hits=F("hits") + 1,
+            last_used_at=timezone.now(),
+        )
+        return transcript.words
+
+    def set(self, audio_hash, language, model_id, words):
+        """Cache words and evict least recently used transcripts"""
+        Transcript.objects.update_or_create(
+            audio_hash=audio_hash,
+            language=language,
+            model_id=model_id,
+            defaults={
+                "words": words,
+                "size": len(json.dumps(words)),
+                "last_used_at": timezone.now(),
+            },
+        )
+        self.__evict()
+
+    def stats(self):
+        """Get hit and miss counters"""
+        hits, misses = get_redis().mget(self.HITS_KEY, self.MISSES_KEY)
+        return {"hits": int(hits or 0), "misses": int(misses or 0)}
+
+    def __evict(self):
+        """Delete least recently used transcripts exceeding max size"""
+        total = Transcript.objects.aggregate(total=Sum("size"))["total"] or 0
+        if total <= self.max_size:
+            return
+
+        evicted = []
+        rows = Transcript.objects.order_by("last_used_at").values_list("id", "size")
+        for transcript_id, size in rows:
+            if total <= self.max_size:
+                break
+            evicted.append(transcript_id)
+            total -= size
+        Transcript.objects.filter(id__in=evicted).delete()
+
+
+class DetectionCache:
+    """
+    File store of per-frame detections of all classes keyed by video stream
+    hash, detection model and detection stride. Least recently used files
+    are evicted beyond max size. Directory is shared by workers, so files
+    may disappear any moment
+    """
+
+    def __init__(self, cache_dir=None, max_size_mb=None):
+        self.cache_dir = cache_dir or settings.DETECTION_CACHE_DIR
+        self.max_size = (max_size_mb or settings.DETECTION_CACHE_MAX_MB) * 2**20
+
+    def get(self, video_hash, model_id, stride):
+        """Get dict of frame index -> (N, 5) detections array or None"""
+        path = self.__get_path(video_hash, model_id, stride)
+        try:
+            with np.load(path) as data:
+                frames, offsets = data["frames"], data["offsets"]
+                rows = np.column_stack((data["boxes"], data["classes"]))
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            return None
+
+        return {
+            int(frame): rows[start:end]
+            for frame, start, end in zip(frames, offsets[:-1], offsets[1:])
+        }
+
+    def set(self, video_hash, model_id, stride, detections):
+        """
+        Store detections as flat arrays and evict old files. Failed write
+        is only logged, so it doesn't fail videojob already censored
+        """
+        frames = sorted(detections)
+        per_frame = [detections[frame] for frame in frames]
+        rows = np.concatenate(per_frame) if per_frame else np.empty((0, 5))
+
+        # Write to temporary file first so readers never see partial one
+        path = self.__get_path(video_hash, model_id, stride)
+        tmp_path = os.path.join(self.cache_dir, f"{uuid4()}{TMP_SUFFIX}")
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.savez_compressed(
+                tmp_path,
+                frames=np.array(frames, dtype=np.int32),
+                offsets=np.cumsum([0] + [len(r) for r in per_frame]),
+                boxes=rows[:, :4].astype(np.float32),
+                classes=rows[:, 4].astype(np.uint8),
+            )
+            os.replace(tmp_path, path)
+            self.__evict()
+        except OSError as e:
+            logger.warning("Detections aren't cached: %s", e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def __get_path(self, video_hash, model_id, stride):
+        return os.path.join(self.cache_dir, f"{video_hash}-{model_id}-{stride}.npz")
+
+    def __evict(self):
+        """Delete least recently used files exceeding max size"""
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(TMP_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            # Another worker may have evicted it already
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
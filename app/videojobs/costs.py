@@ -0,0 +1,95 @@
+from django.conf import settings
+
+from subscriptions.state import get_active_plan
+
+from .admission import get_user_jobs
+
+# Processing seconds per second of media on a CPU worker
+COPY_COST = 0.01
+TRANSCRIPTION_COST = 0.5
+ENCODING_COST = 0.3
+# Processing seconds per frame passed to detection model
+DETECTION_FRAME_COST = 0.05
+# Frame size (px) encoding and detection costs are measured at, they scale
+# with frame area
+REFERENCE_PIXELS = 1280 * 720
+
+# Estimated cost (s) lowering videojob priority by one step and max number
+# of such steps, so long jobs of a plan yield to short ones
+PRIORITY_COST_STEP = 600
+MAX_COST_PENALTY = 3
+# Priority steps a job loses for each other job of its user in flight, so
+# users share workers fairly, and max number of such steps
+USER_JOB_PENALTY = 1
+MAX_USER_JOBS_PENALTY = 3
+
+
+def estimate_cost(media_info, audio_setting=None, video_setting=None):
+    """
+    Estimate videojob processing time (s) from duration, resolution and
+    settings
+    """
+    duration = media_info.duration
+    cost = duration * COPY_COST
+    if audio_setting and audio_setting.is_applied():
+        cost += duration * TRANSCRIPTION_COST
+    # Input without video stream has no picture to censor
+    if video_setting and video_setting.is_applied() and media_info.resolution:
+        width, height = media_info.resolution
+        scale = width * height / REFERENCE_PIXELS
+        frames = duration * media_info.fps / video_setting.detection_stride
+        cost += (duration * ENCODING_COST + frames * DETECTION_FRAME_COST) * scale
+    return cost
+
+
+def estimate_videojob_cost(videojob):
+    """Estimate processing time (s) of videojob"""
+    return estimate_cost(
+        videojob.get_media_info(),
+        videojob.audio_setting,
+        videojob.video_setting,
+    )
+
+
+def get_plan_priority(user_id):
+    """Get priority of user's active subscription plan, 0 if none"""
+    plan = get_active_plan(user_id)
+    return plan.priority if plan else 0
+
+
+def get_queue(cost, audio_setting=None, video_setting=None):
+    """Choose queue of videojob by its kind and cost"""
+    if cost > settings.LONG_JOB_MIN_COST:
+        return settings.LONG_QUEUE
+    if video_setting and video_setting.is_applied():
+        return settings.VISUAL_QUEUE
+    if audio_setting and audio_setting.is_applied():
+        return settings.AUDIO_QUEUE
+    # Nothing to censor, only ffmpeg copy
+    return settings.CELERY_TASK_DEFAULT_QUEUE
+
+
+def get_priority(plan_priority, cost, user_jobs=1):
+    """
+    Get broker priority of videojob, 0 is the highest. Higher plans go
+    first, costly jobs and jobs of users having `user_jobs` in flight are
+    moved back within a few steps
+    """
+    penalty = min(int(cost // PRIORITY_COST_STEP), MAX_COST_PENALTY)
+    penalty += min(max(user_jobs - 1, 0) * USER_JOB_PENALTY, MAX_USER_JOBS_PENALTY)
+    return min(max(9 - plan_priority + penalty, 0), 9)
+
+
+def get_routing(videojob):
+    """Get `apply_async` queue and priority options of videojob"""
+    audio_setting = videojob.audio_setting
+    video_setting = videojob.video_setting
+    cost = estimate_videojob_cost(videojob)
+    return {
+        "queue": get_queue(cost, audio_setting, video_setting),
+        "priority": get_priority(
+            get_plan_priority(videojob.user_id),
+            cost,
+            get_user_jobs(videojob.user_id),
+        ),
+    }
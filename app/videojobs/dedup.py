@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.db.models.fields.files import FieldFile
+
+from .models import VideoJob
+from .registry import ModelRegistry
+from .utils import get_redis
+
+# Blob lock expires if its holder died without releasing it (s)
+BLOB_LOCK_TIMEOUT = 5 * 60
+
+
+def get_file_hash(file):
+    """Get sha256 of file content reading it chunk by chunk"""
+    hasher = hashlib.sha256()
+    for chunk in file.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def get_blob_path(digest, filename):
+    """Generate path of input video stored under its content hash"""
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join("uploads", "blobs", digest[:2], digest + ext)
+
+
+def lock_blob(name):
+    """
+    Get Redis lock of stored file shared by videojobs. Linking file to
+    videojob and deleting it when unreferenced hold it, so file isn't
+    deleted between being linked and referenced
+    """
+    return get_redis().lock(f"blob:{name}", BLOB_LOCK_TIMEOUT)
+
+
+@contextmanager
+def store_input_video(file):
+    """
+    Store input video once per content and yield its name and hash. File
+    already in storage, like completed resumable upload, is moved instead
+    of copied. Stored file is locked until block exits, so videojob using it
+    has to be created within the block
+    """
+    digest = get_file_hash(file)
+    name = get_blob_path(digest, file.name)
+    is_stored = isinstance(file, FieldFile)
+
+    with lock_blob(name):
+        if default_storage.exists(name):
+            if is_stored:
+                file.delete(save=False)
+        elif is_stored:
+            file.close()
+            path = default_storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file_move_safe(file.path, path)
+        else:
+            name = default_storage.save(name, file)
+        yield name, digest
+
+
+def delete_unreferenced_file(file):
+    """Delete stored file unless any videojob still uses it"""
+    if not file:
+        return
+    with lock_blob(file.name):
+        is_referenced = VideoJob.objects.filter(
+            Q(input_video=file.name) | Q(output_video=file.name)
+        ).exists()
+        if not is_referenced:
+            file.delete(save=False)
+
+
+def get_result_key(videojob):
+    """
+    Get hash of everything output of videojob depends on: input content,
+    language, settings and versions of models applying them
+    """
+    parts = {"input": videojob.input_hash, "language": videojob.language}
+    video_setting = videojob.video_setting
+    if video_setting and video_setting.is_applied():
+        parts["video"] = [
+            video_setting.smoking,
+            video_setting.gore,
+            video_setting.detection_stride,
+            ModelRegistry().detector_id,
+            settings.OBFUSCATION_METHOD,
+        ]
+    audio_setting = videojob.audio_setting
+    if audio_setting and audio_setting.is_applied():
+        parts["audio"] = [
+            audio_setting.profanity,
+            audio_setting.insult,
+            sorted(audio_setting.get_own_word_set()),
+            ModelRegistry().transcriber_id,
+            settings.AUDIO_CENSOR_MODE,
+        ]
+    data = json.dumps(parts, sort_keys=True).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+def reuse_result(videojob):
+    """
+    Complete videojob with output of completed one having the same result
+    key. Return False if there is none
+    """
+    if not videojob.input_hash:
+        return False
+    done = (
+        VideoJob.objects.filter(
+            result_key=videojob.result_key,
+            status=VideoJob.COMPLETED,
+        )
+        .exclude(pk=videojob.pk)
+        .exclude(Q(output_video="") | Q(output_video=None))
+        .order_by("-updated_at")
+        .first()
+    )
+    if done is None:
+        return False
+
+    with lock_blob(done.output_video.name):
+        if not default_storage.exists(done.output_video.name):
+            return False
+        videojob.output_video = done.output_video.name
+        videojob.size = done.size
+        videojob.status = VideoJob.COMPLETED
+        videojob.save(update_fields=["output_video", "size", "status", "updated_at"])
+    return True
@@ -0,0 +1,141 @@
+import subprocess
+from itertools import islice
+
+import cv2
+import numpy as np
+
+
+def iter_frames(video_path):
+    """Yield decoded BGR frames of video"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+
+def iter_scaled_frames(video_path, width, height):
+    """Yield BGR frames of video decoded and scaled to given size by ffmpeg"""
+    # fmt: off
+    command = [
+        "ffmpeg",
+        "-loglevel", "error",
+        "-i", video_path,
+        "-map", "0:v:0",
+        "-vf", f"scale={width}:{height}",
+        "-f", "rawvideo",
+        "-pix_fmt", "bgr24",
+        "pipe:1",
+    ]
+    # fmt: on
+    frame_size = width * height * 3
+    decoder = subprocess.Popen(command, stdout=subprocess.PIPE)
+    try:
+        while True:
+            data = decoder.stdout.read(frame_size)
+            if len(data) < frame_size:
+                return
+            yield np.frombuffer(data, np.uint8).reshape(height, width, 3)
+    finally:
+        decoder.stdout.close()
+        decoder.kill()
+        decoder.wait()
+
+
+def pad_boxes(boxes, padding, width, height):
+    """
+    Grow xyxy boxes by `padding` fraction of their size on every side and
+    clip them to frame
+    """
+    if not len(boxes) or not padding:
+        return boxes
+    sizes = np.tile(boxes[:, 2:] - boxes[:, :2], 2)
+    padded = boxes + sizes * padding * np.array([-1, -1, 1, 1])
+    return np.clip(padded, 0, [width, height, width, height])
+
+
+def track_boxes(frames, detect, stride=1, batch_size=1, padding=0.0):
+    """
+    Yield (frame, boxes) for every frame of `frames`.
+
+    `detect` takes lists of frame indices and frames and returns list of
+    (N, 4) xyxy box arrays. It runs in batches on every `stride`-th frame and on the last
+    one. Skipped frames get union of boxes of the surrounding detected
+    frames grown by `padding`, so objects moving between them stay covered
+    """
+    frames = iter(frames)
+    window_size = batch_size * stride + 1
+    carried = None  # Last detected frame of previous window and its boxes
+    position = 0  # Index of window's first frame in video
+
+    while True:
+        window = [carried[0]] if carried else []
+        window += islice(frames, window_size - len(window))
+        if not window:
+            return
+        eof = len(window) < window_size
+
+        # Detect on every stride-th frame and on the last frame of window
+        keys = list(range(0, len(window), stride))
+        if keys[-1] != len(window) - 1:
+            keys.append(len(window) - 1)
+        boxes = {0: carried[1]} if carried else {}
+        pending = [i for i in keys if i not in boxes]
+        detected = detect(
+            [position + i for i in pending],
+            [window[i] for i in pending],
+        )
+        for i, frame_boxes in zip(pending, detected):
+            boxes[i] = frame_boxes
+
+        # Last frame opens the next window unless video ended
+        end = len(window) if eof else len(window) - 1
+        prev = 0
+        for i in range(end):
+            if i in boxes:
+                prev = i
+                yield window[i], boxes[i]
+                continue
+            following = min(prev + stride, keys[-1])
+            height, width = window[i].shape[:2]
+            frame_boxes = np.concatenate((boxes[prev], boxes[following]))
+            yield window[i], pad_boxes(frame_boxes, padding, width, height)
+
+        if eof:
+            return
+        carried = (window[-1], boxes[len(window) - 1])
+        position += len(window) - 1
+
+
+class Detector:
+    """
+    Detect objects of all classes on batches of frames with YOLO model and
+    return boxes of requested classes. Detections are kept by frame index
+    in `detections`, frames found there aren't passed to the model
+    """
+
+    def __init__(self, get_model, classes, detections=None):
+        self.get_model = get_model
+        self.classes = classes
+        # Frame index -> (N, 5) array of xyxy boxes with class id
+        self.detections = {} if detections is None else detections
+
+    def __call__(self, indices, frames):
+        missing = [(i, f) for i, f in zip(indices, frames) if i not in self.detections]
+        if missing:
+            model = self.get_model()
+            results = model([f for _, f in missing], verbose=False)
+            for (i, _), r in zip(missing, results):
+                self.detections[i] = np.column_stack(
+                    (r.boxes.xyxy.cpu().numpy(), r.boxes.cls.cpu().numpy())
+                )
+
+        return [self.__filter(self.detections[i]) for i in indices]
+
+    def __filter(self, detections):
+        """Get boxes of requested classes"""
+        return detections[np.isin(detections[:, 4], self.classes), :4]
@@ -0,0 +1,113 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+# Bytes read from file and sent at once
+DOWNLOAD_BLOCK_SIZE = 2**16
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def get_file_etag(stat):
+    """Get ETag of file from its size and modification time"""
+    return quote_etag(f"{stat.st_size:x}-{stat.st_mtime_ns:x}")
+
+
+def parse_range(header, size):
+    """
+    Parse single `bytes=start-end` range to (start, end) inclusive bounds
+    within file size. Return None if there is no range to serve, like for
+    multiple ranges, and raise ValueError if range is unsatisfiable
+    """
+    match = RANGE_PATTERN.fullmatch((header or "").strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if not start:
+        # Suffix range, last N bytes
+        length = int(end)
+        if not length:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range is out of file")
+    return start, end
+
+
+def iter_file_range(path, start, length):
+    """Yield `length` bytes of file from start block by block"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(DOWNLOAD_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def serve_file(request, file, filename):
+    """
+    Serve stored file with ETag and conditional requests support. Single
+    byte range is served as 206, and the whole file is sent by web server
+    if DOWNLOAD_OFFLOAD is set, so the worker isn't busy streaming it
+    """
+    path = file.path
+    stat = os.stat(path)
+    etag = get_file_etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    # 304 or 412 on If-None-Match, If-Modified-Since and alike
+    response = get_conditional_response(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    if settings.DOWNLOAD_OFFLOAD:
+        response = HttpResponse()
+        # Names of user files may be non-ASCII, which Django would MIME-encode
+        # in header, so they're URL-quoted for web server to decode
+        if settings.DOWNLOAD_OFFLOAD == "x-accel-redirect":
+            # Web server handles ranges and conditions itself
+            location = settings.DOWNLOAD_ACCEL_PREFIX.rstrip("/") + "/" + file.name
+            response["X-Accel-Redirect"] = quote(location)
+        else:
+            response["X-Sendfile"] = quote(path)
+    else:
+        byte_range = None
+        if_range = request.headers.get("If-Range")
+        # Range of changed file isn't served, the whole new one is
+        if not if_range or if_range in (
+            etag,
+            http_date(last_modified),
+        ):
+            try:
+                byte_range = parse_range(request.headers.get("Range"), stat.st_size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{stat.st_size}"
+                return response
+
+        start, end = byte_range or (0, stat.st_size - 1)
+        length = end - start + 1
+        response = StreamingHttpResponse(iter_file_range(path, start, length))
+        response["Content-Length"] = length
+        if byte_range:
+            response.status_code = 206
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+
+    content_type = mimetypes.guess_type(filename)[0]
+    response["Content-Type"] = content_type or "application/octet-stream"
+    response["Content-Disposition"] = content_disposition_header(False, filename)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
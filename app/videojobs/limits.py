@@ -0,0 +1,128 @@
+import math
+import time
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+
+from django.utils import timezone
+
+from .utils import get_redis, get_script
+
+# Running videojob slot expires if its worker died without releasing it
+SLOT_LEASE = 6 * 3600
+
+RESERVE_USAGE_SCRIPT = """
+local used = tonumber(redis.call("GET", KEYS[1]) or "0")
+if tonumber(ARGV[2]) > 0 and used + tonumber(ARGV[1]) > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call("INCRBY", KEYS[1], ARGV[1])
+redis.call("EXPIRE", KEYS[1], ARGV[3])
+return 1
+"""
+
+ACQUIRE_SLOT_SCRIPT = """
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", ARGV[2])
+if not redis.call("ZSCORE", KEYS[1], ARGV[1]) then
+    local limit = tonumber(ARGV[3])
+    if limit > 0 and redis.call("ZCARD", KEYS[1]) >= limit then
+        return 0
+    end
+end
+redis.call("ZADD", KEYS[1], tonumber(ARGV[2]) + tonumber(ARGV[4]), ARGV[1])
+redis.call("EXPIRE", KEYS[1], ARGV[4])
+return 1
+"""
+
+
+def get_usage_key(user_id, month):
+    """Get key of processed seconds of user in month"""
+    return f"limits:{user_id}:usage:{month:%Y-%m}"
+
+
+def get_running_key(user_id):
+    """Get sorted set of running videojobs of user scored by lease end"""
+    return f"limits:{user_id}:running"
+
+
+def get_usage_seconds(media_info):
+    """Get seconds of plan's monthly minutes used by processing video"""
+    return math.ceil(media_info.duration)
+
+
+def get_usage_month(moment=None):
+    """
+    Get start (UTC) of month which usage at moment counts in, now by
+    default. Reserve and refund use it, so both hit the same month
+    """
+    moment = (moment or timezone.now()).astimezone(dt_timezone.utc)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_next_month(month):
+    """Get start of month following the given one"""
+    return (month.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def get_month_left_seconds():
+    """Get seconds until monthly usage starts over"""
+    next_month = get_next_month(get_usage_month())
+    return round((next_month - timezone.now()).total_seconds())
+
+
+def is_video_too_long(plan, media_info):
+    """Check if video is longer than plan allows"""
+    if plan is None or not plan.max_video_minutes:
+        return False
+    return media_info.duration > plan.max_video_minutes * 60
+
+
+def is_usage_exhausted(user_id, plan):
+    """Check if monthly minutes of user's plan are used up"""
+    if plan is None or not plan.monthly_minutes:
+        return False
+    used = int(get_redis().get(get_usage_key(user_id, get_usage_month())) or 0)
+    return used >= plan.monthly_minutes * 60
+
+
+def reserve_usage(user_id, plan, seconds):
+    """
+    Add processed seconds to user's usage of this month unless it exceeds
+    monthly minutes of plan. Return False if it does
+    """
+    limit = plan.monthly_minutes * 60 if plan and plan.monthly_minutes else 0
+    month = get_usage_month()
+    # Usage of the month is kept a bit longer than the month itself
+    ttl = (get_next_month(month) - month).days * 86400 + 86400
+    return bool(
+        get_script(RESERVE_USAGE_SCRIPT)(
+            keys=[get_usage_key(user_id, month)],
+            args=[seconds, limit, ttl],
+        )
+    )
+
+
+def refund_usage(user_id, created_at, seconds):
+    """Take back processed seconds of videojob created at given moment"""
+    key = get_usage_key(user_id, get_usage_month(created_at))
+    redis = get_redis()
+    if redis.exists(key):
+        redis.decrby(key, seconds)
+
+
+def acquire_slot(video_id, user_id, plan):
+    """
+    Take one of running videojob slots of user limited by concurrency of
+    plan. Return False if all slots are taken
+    """
+    limit = (plan.max_concurrent_jobs or 0) if plan else 0
+    return bool(
+        get_script(ACQUIRE_SLOT_SCRIPT)(
+            keys=[get_running_key(user_id)],
+            args=[video_id, time.time(), limit, SLOT_LEASE],
+        )
+    )
+
+
+def release_slot(video_id, user_id):
+    """Free running videojob slot of user"""
+    get_redis().zrem(get_running_key(user_id), video_id)
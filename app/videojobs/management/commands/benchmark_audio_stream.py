@@ -0,0 +1,135 @@
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from pydub import AudioSegment
+
+from videojobs.audio import censor_samples
+from videojobs.media import MediaInfo
+from videojobs.tasks import VideoSoundCensor
+from videojobs.utils import get_rss_mb
+
+
+def get_peak_rss_mb():
+    """Get peak resident memory of current process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+class Command(BaseCommand):
+    """
+    Check that streaming audio censoring memory doesn't grow with audio
+    length and compare it with full decode by pydub
+    """
+
+    help = "Benchmark peak memory of streaming audio censoring"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--duration",
+            type=int,
+            default=3600,
+            help="Synthetic audio duration in seconds",
+        )
+        parser.add_argument(
+            "--words",
+            type=int,
+            default=1000,
+            help="Number of flagged words",
+        )
+        parser.add_argument(
+            "--max-rss-mb",
+            type=float,
+            default=64,
+            help="Fail if streaming grows peak memory more than that",
+        )
+        parser.add_argument(
+            "--pydub",
+            action="store_true",
+            help="Also measure full decode and wav export by pydub",
+        )
+
+    def handle(self, *args, **options):
+        duration = options["duration"]
+        step = duration / options["words"]
+        intervals = [
+            (i * step, i * step + min(step, 0.4)) for i in range(options["words"])
+        ]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = self.__create_audio(tmp_dir, duration)
+            media_info = MediaInfo.probe(path)
+            self.stdout.write(
+                f"Audio: {duration}s, {media_info.audio['sample_rate']}Hz, "
+                f"{media_info.audio['channels']} channels"
+            )
+
+            # Streaming is measured first as peak memory never goes down
+            baseline = get_rss_mb()
+            sound_censor = VideoSoundCensor(media_info)
+            # fmt: off
+            command = [
+                "ffmpeg",
+                "-loglevel", "error",
+                *sound_censor.get_pcm_options(),
+                "-i", "pipe:0",
+                "-c:a", "aac",
+                "-f", "null", "-",
+            ]
+            # fmt: on
+            start = time.perf_counter()
+            sound_censor.stream(path, intervals, command)
+            stream_time = time.perf_counter() - start
+            stream_growth = get_peak_rss_mb() - baseline
+            self.stdout.write(
+                f"stream: {stream_time:.1f}s, peak RSS +{stream_growth:.0f} MB"
+            )
+
+            if options["pydub"]:
+                start = time.perf_counter()
+                audio = self.__censor_decoded(AudioSegment.from_file(path), intervals)
+                audio.export(os.path.join(tmp_dir, "censored.wav"), format="wav")
+                pydub_time = time.perf_counter() - start
+                self.stdout.write(
+                    f"pydub: {pydub_time:.1f}s, "
+                    f"peak RSS +{get_peak_rss_mb() - baseline:.0f} MB"
+                )
+
+        if stream_growth > options["max_rss_mb"]:
+            raise CommandError(
+                f"Streaming grew peak RSS by {stream_growth:.0f} MB, "
+                f"ceiling is {options['max_rss_mb']:.0f} MB"
+            )
+
+    def __censor_decoded(self, audio, intervals):
+        """Censor pydub AudioSegment decoded whole into memory as baseline"""
+        # Work with 16/32 bit PCM only, numpy has no 24 bit integer type
+        if audio.sample_width not in (2, 4):
+            audio = audio.set_sample_width(2)
+
+        dtype = np.int16 if audio.sample_width == 2 else np.int32
+        samples = np.frombuffer(audio.raw_data, dtype=dtype)
+        samples = samples.reshape(-1, audio.channels).copy()
+
+        censor_samples(samples, audio.frame_rate, intervals)
+        return audio._spawn(samples.tobytes())
+
+    def __create_audio(self, tmp_dir, duration):
+        """Encode stereo sine tone of given duration to AAC file"""
+        path = os.path.join(tmp_dir, "audio.m4a")
+        # fmt: off
+        command = [
+            "ffmpeg",
+            "-loglevel", "error",
+            "-f", "lavfi",
+            "-i", f"sine=frequency=440:sample_rate=44100:duration={duration}",
+            "-ac", "2",
+            "-c:a", "aac",
+            path,
+        ]
+        # fmt: on
+        subprocess.run(command, check=True)
+        return path
@@ -0,0 +1,75 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from videojobs.banwords import BanWordMatcher, stem_word
+
+
+class Command(BaseCommand):
+    """Measure ban word matcher compile and match time on large lists"""
+
+    help = "Benchmark ban word matcher against ban list size"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[100, 1000, 10000, 100000],
+            help="Numbers of ban words and phrases",
+        )
+        parser.add_argument(
+            "--words",
+            type=int,
+            default=20000,
+            help="Number of words in synthetic transcript",
+        )
+        parser.add_argument(
+            "--phrase-share",
+            type=float,
+            default=0.2,
+            help="Share of multi-word phrases in ban list",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        vocabulary = [self.__create_word(rng) for _ in range(50000)]
+        transcript = rng.choices(vocabulary, k=options["words"])
+
+        self.stdout.write(
+            f"Transcript: {len(transcript)} words, "
+            f"vocabulary: {len(vocabulary)} words"
+        )
+        self.stdout.write(
+            f"{'size':>8} {'compile, ms':>12} {'match, ms':>10} "
+            f"{'words/s':>10} {'matches':>8}"
+        )
+        for size in options["sizes"]:
+            phrases = [
+                " ".join(rng.choices(vocabulary, k=rng.randint(2, 3)))
+                if rng.random() < options["phrase_share"]
+                else rng.choice(vocabulary)
+                for _ in range(size)
+            ]
+
+            # Measure with cold stem cache
+            stem_word.cache_clear()
+            start = time.perf_counter()
+            matcher = BanWordMatcher("en", phrases=phrases)
+            compile_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            matches = matcher.find(transcript)
+            match_time = time.perf_counter() - start
+
+            self.stdout.write(
+                f"{size:>8} {compile_time * 1000:>12.1f} "
+                f"{match_time * 1000:>10.1f} "
+                f"{len(transcript) / match_time:>10.0f} {len(matches):>8}"
+            )
+
+    def __create_word(self, rng):
+        """Create random lowercase word"""
+        return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+from videojobs.audio import censor_samples
+
+
+class Command(BaseCommand):
+    """Measure how audio censoring time grows with number of ban words"""
+
+    help = "Benchmark beep mixer against number of flagged words"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--duration",
+            type=int,
+            default=600,
+            help="Synthetic audio duration in seconds",
+        )
+        parser.add_argument(
+            "--words",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000, 5000],
+            help="Numbers of flagged words to measure",
+        )
+        parser.add_argument(
+            "--legacy",
+            action="store_true",
+            help="Also measure per-word segment splicing",
+        )
+
+    def handle(self, *args, **options):
+        duration = options["duration"]
+        samples = self.__create_samples(duration)
+
+        self.stdout.write(f"Audio: {duration}s, 44100Hz stereo")
+        self.stdout.write(f"{'words':>8} {'vectorized, s':>14} {'legacy, s':>10}")
+        for count in options["words"]:
+            intervals = self.__create_intervals(count, duration)
+
+            start = time.perf_counter()
+            censor_samples(samples.copy(), 44100, intervals)
+            vectorized = time.perf_counter() - start
+
+            legacy = "-"
+            if options["legacy"]:
+                start = time.perf_counter()
+                self.__splice(self.__create_audio(samples), intervals)
+                legacy = f"{time.perf_counter() - start:.3f}"
+
+            self.stdout.write(f"{count:>8} {vectorized:>14.3f} {legacy:>10}")
+
+    def __create_samples(self, duration):
+        """Create stereo white noise samples"""
+        rng = np.random.default_rng(0)
+        return rng.integers(-3000, 3000, (duration * 44100, 2), np.int16)
+
+    def __create_audio(self, samples):
+        """Wrap samples into pydub audio segment for legacy splicing"""
+        return AudioSegment(
+            samples.tobytes(),
+            sample_width=2,
+            frame_rate=44100,
+            channels=2,
+        )
+
+    def __create_intervals(self, count, duration):
+        """Create word intervals spread evenly over the audio"""
+        step = duration / count
+        return [(i * step, i * step + min(step, 0.4)) for i in range(count)]
+
+    def __splice(self, audio, intervals):
+        """Censor by rebuilding the segment for each word"""
+        for start, end in intervals:
+            start_ms, end_ms = start * 1000, end * 1000
+            beep = Sine(1000).to_audio_segment(duration=end_ms - start_ms) - 20
+            audio = audio[:start_ms] + beep + audio[end_ms:]
+        return audio
@@ -0,0 +1,114 @@
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ultralytics import YOLO
+
+from videojobs.detection import Detector, iter_frames, track_boxes
+
+
+class Command(BaseCommand):
+    """
+    Compare speed and coverage of strided detection against exhaustive one
+    """
+
+    help = "Benchmark detection stride accuracy against speed on video clips"
+
+    def add_arguments(self, parser):
+        parser.add_argument("clips", nargs="+", help="Sample video paths")
+        parser.add_argument(
+            "--model",
+            default=settings.DETECTION_MODEL_PATH,
+            help="Detection model path",
+        )
+        parser.add_argument(
+            "--classes",
+            type=int,
+            nargs="+",
+            default=[1, 3],
+            help="Class ids to detect",
+        )
+        parser.add_argument(
+            "--strides",
+            type=int,
+            nargs="+",
+            default=[2, 3, 5],
+            help="Strides to compare with exhaustive detection",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.DETECTION_BATCH_SIZE,
+        )
+        parser.add_argument(
+            "--padding",
+            type=float,
+            default=settings.DETECTION_BOX_PADDING,
+        )
+
+    def handle(self, *args, **options):
+        model = YOLO(options["model"])
+
+        self.stdout.write(
+            f"{'clip':<24} {'stride':>6} {'fps':>8} {'speedup':>8} "
+            f"{'recall':>8} {'over':>8}"
+        )
+        for clip in options["clips"]:
+            # Exhaustive detection is the reference
+            reference, ref_fps = self.__run(clip, model, 1, options)
+            self.__report(clip, 1, ref_fps, 1, 1, 0)
+
+            for stride in options["strides"]:
+                boxes, fps = self.__run(clip, model, stride, options)
+                recall, over = self.__compare(boxes, reference)
+                speedup = fps / ref_fps
+                self.__report(clip, stride, fps, speedup, recall, over)
+
+    def __run(self, clip, model, stride, options):
+        """Detect boxes on every frame, return them with frames per second"""
+        detector = Detector(lambda: model, options["classes"])
+        start = time.perf_counter()
+        boxes = [
+            (frame.shape[:2], frame_boxes.astype(int))
+            for frame, frame_boxes in track_boxes(
+                iter_frames(clip),
+                detector,
+                stride=stride,
+                batch_size=options["batch_size"],
+                padding=options["padding"] if stride > 1 else 0,
+            )
+        ]
+        return boxes, len(boxes) / (time.perf_counter() - start)
+
+    def __compare(self, boxes, reference):
+        """
+        Return share of reference box area covered by strided boxes and
+        share of extra blurred area relative to reference one
+        """
+        ref_area = covered_area = extra_area = 0
+        for (shape, frame_boxes), (_, ref_boxes) in zip(boxes, reference):
+            mask = self.__mask(shape, frame_boxes)
+            ref_mask = self.__mask(shape, ref_boxes)
+            ref_area += ref_mask.sum()
+            covered_area += (mask & ref_mask).sum()
+            extra_area += (mask & ~ref_mask).sum()
+
+        if not ref_area:
+            return 1, 0
+        return covered_area / ref_area, extra_area / ref_area
+
+    def __mask(self, shape, boxes):
+        """Create boolean mask of box areas"""
+        mask = np.zeros(shape, dtype=bool)
+        for x1, y1, x2, y2 in boxes:
+            mask[y1:y2, x1:x2] = True
+        return mask
+
+    def __report(self, clip, stride, fps, speedup, recall, over):
+        name = os.path.basename(clip)[:24]
+        self.stdout.write(
+            f"{name:<24} {stride:>6} {fps:>8.1f} {speedup:>8.2f} "
+            f"{recall:>8.3f} {over:>8.3f}"
+        )
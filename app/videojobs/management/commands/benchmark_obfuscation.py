@@ -0,0 +1,77 @@
+import time
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from videojobs.obfuscation import OBFUSCATORS
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+
+def gaussian_151(region):
+    """Full resolution blur with fixed kernel, the former method"""
+    region[:] = cv2.GaussianBlur(region, (151, 151), 0)
+
+
+class Command(BaseCommand):
+    """Compare per-frame cost of obfuscation methods across resolutions"""
+
+    help = "Benchmark obfuscation methods on frames of different resolutions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--resolutions",
+            nargs="+",
+            choices=RESOLUTIONS,
+            default=list(RESOLUTIONS),
+        )
+        parser.add_argument(
+            "--box-share",
+            type=float,
+            default=0.3,
+            help="Box side relative to frame side",
+        )
+        parser.add_argument(
+            "--boxes",
+            type=int,
+            default=2,
+            help="Number of boxes per frame",
+        )
+        parser.add_argument("--frames", type=int, default=20)
+
+    def handle(self, *args, **options):
+        methods = {**OBFUSCATORS, "gaussian_151": gaussian_151}
+        rng = np.random.default_rng(0)
+
+        self.stdout.write(
+            f"{options['boxes']} boxes of {options['box_share']:.0%} "
+            "frame side per frame"
+        )
+        self.stdout.write(f"{'resolution':<12}" + "".join(f"{m:>14}" for m in methods))
+        for resolution in options["resolutions"]:
+            width, height = RESOLUTIONS[resolution]
+            frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+            boxes = self.__create_boxes(rng, width, height, options)
+
+            row = f"{resolution:<12}"
+            for method in methods.values():
+                start = time.perf_counter()
+                for _ in range(options["frames"]):
+                    for x1, y1, x2, y2 in boxes:
+                        method(frame[y1:y2, x1:x2])
+                ms = (time.perf_counter() - start) / options["frames"] * 1000
+                row += f"{ms:>11.2f} ms"
+            self.stdout.write(row)
+
+    def __create_boxes(self, rng, width, height, options):
+        """Create boxes of given size at random positions"""
+        box_width = int(width * options["box_share"])
+        box_height = int(height * options["box_share"])
+        x1 = rng.integers(0, width - box_width, options["boxes"])
+        y1 = rng.integers(0, height - box_height, options["boxes"])
+        return np.column_stack((x1, y1, x1 + box_width, y1 + box_height))
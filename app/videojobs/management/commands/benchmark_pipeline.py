@@ -0,0 +1,493 @@
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import override_settings
+
+from videojobs.media import MediaInfo
+from videojobs.metrics import get_peak_rss_mb, pop_timings, start_timings
+from videojobs.models import AudioSetting, Transcript, VideoSetting
+from videojobs.registry import ModelRegistry
+from videojobs.tasks import CensorshipProcessor
+from videojobs.utils import get_rss_mb, get_stream_hash
+
+# Word flagged by audio setting of benchmark jobs
+FLAGGED_WORD = "flagged"
+# Detection calls in a row showing the same content, so it's in scenes
+SCENE_LENGTH = 25
+
+# Settings affecting pipeline speed, stored with results
+RECORDED_SETTINGS = (
+    "COPY_THROUGH",
+    "CENSOR_MAX_WORKERS",
+    "DETECTION_BATCH_SIZE",
+    "DETECTION_NUM_THREADS",
+    "DETECTION_SCAN_SIZE",
+    "OBFUSCATION_METHOD",
+    "AUDIO_CENSOR_MODE",
+    "TRANSCRIPTION_CHUNK_SECONDS",
+    "WHISPER_NUM_WORKERS",
+)
+
+
+class StubArray:
+    """Array with torch tensor methods used by `Detector`"""
+
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class StubDetector:
+    """
+    YOLO stand-in finding an object on `density` share of frames. Objects
+    come in scenes of SCENE_LENGTH detection calls spread evenly over video
+    """
+
+    def __init__(self, density):
+        self.density = density
+        self.calls = 0
+
+    def __call__(self, frames, verbose=False):
+        results = []
+        for frame in frames:
+            scene = self.calls // SCENE_LENGTH
+            self.calls += 1
+            # Golden ratio sequence spreads scenes evenly for any density
+            has_object = (scene * 0.618034) % 1 < self.density
+            height, width = frame.shape[:2]
+            boxes = np.empty((0, 4))
+            if has_object:
+                boxes = np.array([[width / 4, height / 4, width / 2, height / 2]])
+            results.append(
+                SimpleNamespace(
+                    boxes=SimpleNamespace(
+                        xyxy=StubArray(boxes),
+                        cls=StubArray(np.ones(len(boxes))),
+                    )
+                )
+            )
+        return results
+
+
+class StubTranscriber:
+    """
+    Whisper stand-in saying `speech_rate` words per second, every
+    `flagged_every`-th of them is FLAGGED_WORD
+    """
+
+    WORD_SECONDS = 0.3
+
+    def __init__(self, duration, speech_rate, flagged_every):
+        self.duration = duration
+        self.speech_rate = speech_rate
+        self.flagged_every = flagged_every
+
+    def transcribe_with_timestamps(self, file_path, lang, on_progress=None, **kwargs):
+        words = []
+        for i in range(int(self.duration * self.speech_rate)):
+            start = i / self.speech_rate
+            value = FLAGGED_WORD if i % self.flagged_every == 0 else "word"
+            words.append(
+                {"value": value, "start": start, "end": start + self.WORD_SECONDS}
+            )
+        if on_progress:
+            on_progress(self.duration)
+        return words
+
+
+class Command(BaseCommand):
+    """
+    Run CensorshipProcessor on synthetic videos of different resolutions,
+    durations, speech and content densities, with stub models unless real
+    ones are given. Every run is made in a forked process, so its peak
+    memory is its own. Results are written to a JSON baseline and compared
+    with a previous one
+    """
+
+    help = "Benchmark censoring pipeline end to end on synthetic videos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--resolutions",
+            nargs="+",
+            default=["640x360", "1280x720"],
+            help="Video sizes as WIDTHxHEIGHT",
+        )
+        parser.add_argument(
+            "--durations",
+            type=int,
+            nargs="+",
+            default=[10, 30],
+            help="Video durations in seconds",
+        )
+        parser.add_argument(
+            "--audio",
+            choices=["with", "without"],
+            nargs="+",
+            default=["with", "without"],
+            help="Generate videos with and/or without audio stream",
+        )
+        parser.add_argument(
+            "--speech-rates",
+            type=float,
+            nargs="+",
+            default=[0.5, 3],
+            help="Words per second said by stub transcriber",
+        )
+        parser.add_argument(
+            "--flagged-every",
+            type=int,
+            default=10,
+            help="Every Nth word said is flagged",
+        )
+        parser.add_argument(
+            "--content-densities",
+            type=float,
+            nargs="+",
+            default=[0, 0.2, 1],
+            help="Shares of frames with flagged objects for stub detector",
+        )
+        parser.add_argument(
+            "--stride",
+            type=int,
+            default=3,
+            help="Detection stride of benchmark jobs",
+        )
+        parser.add_argument(
+            "--fps",
+            type=int,
+            default=25,
+            help="Frame rate of synthetic videos",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Runs of every case",
+        )
+        parser.add_argument(
+            "--detector",
+            help="Path to small YOLO weights used instead of stub detector",
+        )
+        parser.add_argument(
+            "--transcriber",
+            help="Whisper model size, like `tiny`, used instead of stub",
+        )
+        parser.add_argument(
+            "--set",
+            dest="overrides",
+            action="append",
+            default=[],
+            metavar="NAME=VALUE",
+            help="Override setting, value is parsed as JSON if possible",
+        )
+        parser.add_argument("--output", help="Write results to JSON file")
+        parser.add_argument("--compare", help="Baseline JSON file to compare with")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.1,
+            help="Fail if median latency of a case grows more than that share",
+        )
+
+    def handle(self, *args, **options):
+        overrides = dict(self.__parse_override(o) for o in options["overrides"])
+        if options["detector"]:
+            overrides["DETECTION_MODEL_PATH"] = options["detector"]
+        # Stub transcripts are cached apart from real ones
+        overrides["WHISPER_MODEL_SIZE"] = options["transcriber"] or "benchmark-stub"
+
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(
+            DETECTION_CACHE_DIR=os.path.join(tmp_dir, "detection-cache"),
+            **overrides,
+        ):
+            results = self.__run_cases(tmp_dir, options)
+            baseline = {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "environment": self.__get_environment(),
+                "settings": {
+                    name: getattr(settings, name)
+                    for name in (*RECORDED_SETTINGS, *overrides)
+                },
+                "detector": options["detector"] or "stub",
+                "transcriber": options["transcriber"] or "stub",
+                "cases": results,
+            }
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(baseline, f, indent=2)
+            self.stdout.write(f"Results are written to {options['output']}")
+        if options["compare"]:
+            self.__compare(results, options["compare"], options["tolerance"])
+
+    def __run_cases(self, tmp_dir, options):
+        """Run every combination of video and censorship parameters"""
+        self.stdout.write(
+            f"{'case':<44} {'p50, s':>8} {'p90, s':>8} {'fps':>8} "
+            f"{'RTF':>6} {'+RSS, MB':>9}"
+        )
+        results = {}
+        for resolution, duration, audio in itertools.product(
+            options["resolutions"],
+            options["durations"],
+            options["audio"],
+        ):
+            has_audio = audio == "with"
+            path = self.__create_video(
+                tmp_dir, resolution, duration, options["fps"], has_audio
+            )
+            media_info = MediaInfo.probe(path)
+            audio_hash = has_audio and get_stream_hash(path, "a")
+
+            speech_rates = options["speech_rates"] if has_audio else [None]
+            for speech_rate, density in itertools.product(
+                speech_rates,
+                options["content_densities"],
+            ):
+                name = f"{resolution}-{duration}s-{audio}-audio"
+                if speech_rate is not None:
+                    name += f"-speech{speech_rate:g}"
+                name += f"-content{density:g}"
+
+                case = {
+                    "resolution": resolution,
+                    "duration": duration,
+                    "fps": options["fps"],
+                    "audio": has_audio,
+                    "speech_rate": speech_rate,
+                    "flagged_every": options["flagged_every"],
+                    "content_density": density,
+                    "stride": options["stride"],
+                }
+                runs = []
+                for _ in range(options["repeat"]):
+                    self.__clear_caches(audio_hash)
+                    runs.append(self.__run_forked(path, media_info, case, options))
+                self.__clear_caches(audio_hash)
+
+                results[name] = self.__summarize(case, runs)
+                self.__write_summary(name, results[name])
+        return results
+
+    def __clear_caches(self, audio_hash):
+        """
+        Drop cached transcripts and detections, so each run measures the
+        whole pipeline rather than cache hits
+        """
+        if audio_hash:
+            Transcript.objects.filter(audio_hash=audio_hash).delete()
+        shutil.rmtree(settings.DETECTION_CACHE_DIR, ignore_errors=True)
+
+    def __run_forked(self, path, media_info, case, options):
+        """Run processor in a forked process and get its measures"""
+        # Connections must not be shared with the child
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=self.__run,
+            args=(sender, path, media_info, case, options),
+        )
+        process.start()
+        sender.close()
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = {"error": "Benchmark process exited"}
+        process.join()
+        if "error" in result:
+            raise CommandError(f"Benchmark run failed: {result['error']}")
+        return result
+
+    def __run(self, sender, path, media_info, case, options):
+        """Censor video with stub or given models and send measures"""
+        try:
+            registry = ModelRegistry()
+            if options["detector"]:
+                registry.get_detector()
+            else:
+                registry.register(
+                    registry.DETECTOR,
+                    StubDetector(case["content_density"]),
+                )
+            if options["transcriber"]:
+                registry.get_transcriber()
+            elif case["audio"]:
+                registry.register(
+                    registry.TRANSCRIBER,
+                    StubTranscriber(
+                        case["duration"],
+                        case["speech_rate"],
+                        case["flagged_every"],
+                    ),
+                )
+
+            job = SimpleNamespace(
+                id=f"benchmark-{uuid4()}",
+                language="en",
+                input_video=SimpleNamespace(path=path),
+                get_media_info=lambda: media_info,
+                video_setting=VideoSetting(gore=True, detection_stride=case["stride"]),
+                audio_setting=(
+                    AudioSetting(own_words=FLAGGED_WORD) if case["audio"] else None
+                ),
+            )
+            work_dir = os.path.join(os.path.dirname(path), job.id)
+            os.makedirs(work_dir)
+
+            rss_before = get_rss_mb()
+            start_timings(job.id)
+            start = time.perf_counter()
+            result_path = CensorshipProcessor(job, work_dir).run()
+            latency = time.perf_counter() - start
+            timings = pop_timings(job.id, media_info.duration)
+            os.remove(result_path)
+
+            sender.send(
+                {
+                    "latency": latency,
+                    "peak_rss_mb": get_peak_rss_mb(),
+                    "rss_growth_mb": get_peak_rss_mb() - rss_before,
+                    "stages": {
+                        name: stage["wall"] for name, stage in timings["stages"].items()
+                    },
+                }
+            )
+        except Exception as e:
+            sender.send({"error": repr(e)})
+        finally:
+            sender.close()
+
+    def __summarize(self, case, runs):
+        """Get latency percentiles, throughput and memory of case runs"""
+        latencies = np.array([run["latency"] for run in runs])
+        p50 = float(np.percentile(latencies, 50))
+        frames = case["duration"] * case["fps"]
+        stages = sorted({name for run in runs for name in run["stages"]})
+        return {
+            "params": case,
+            "latencies": [round(latency, 3) for latency in latencies],
+            "latency": {
+                "mean": round(float(latencies.mean()), 3),
+                "p50": round(p50, 3),
+                "p90": round(float(np.percentile(latencies, 90)), 3),
+                "p99": round(float(np.percentile(latencies, 99)), 3),
+            },
+            "fps": round(frames / p50, 1),
+            "realtime_factor": round(p50 / case["duration"], 3),
+            "peak_rss_mb": round(max(run["peak_rss_mb"] for run in runs), 1),
+            "rss_growth_mb": round(max(run["rss_growth_mb"] for run in runs), 1),
+            "stages": {
+                name: round(
+                    sum(run["stages"].get(name, 0) for run in runs) / len(runs), 3
+                )
+                for name in stages
+            },
+        }
+
+    def __write_summary(self, name, summary):
+        self.stdout.write(
+            f"{name:<44} {summary['latency']['p50']:>8.2f} "
+            f"{summary['latency']['p90']:>8.2f} {summary['fps']:>8.1f} "
+            f"{summary['realtime_factor']:>6.2f} {summary['rss_growth_mb']:>9.0f}"
+        )
+
+    def __compare(self, results, baseline_path, tolerance):
+        """Compare median latency of cases with baseline ones"""
+        with open(baseline_path) as f:
+            baseline = json.load(f)["cases"]
+
+        self.stdout.write(f"{'case':<44} {'base, s':>8} {'now, s':>8} {'change':>8}")
+        regressions = []
+        for name, summary in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]["latency"]["p50"]
+            now = summary["latency"]["p50"]
+            change = now / before - 1 if before else 0
+            self.stdout.write(f"{name:<44} {before:>8.2f} {now:>8.2f} {change:>+8.1%}")
+            if change > tolerance:
+                regressions.append(name)
+
+        if regressions:
+            raise CommandError(
+                f"Median latency grew more than {tolerance:.0%} in: "
+                + ", ".join(regressions)
+            )
+
+    def __create_video(self, tmp_dir, resolution, duration, fps, has_audio):
+        """Encode test pattern video with a keyframe every second"""
+        suffix = "audio" if has_audio else "mute"
+        path = os.path.join(tmp_dir, f"{resolution}-{duration}s-{suffix}.mp4")
+        audio_input = []
+        audio_output = []
+        if has_audio:
+            # fmt: off
+            audio_input = [
+                "-f", "lavfi",
+                "-i", f"sine=frequency=440:sample_rate=44100:duration={duration}",
+            ]
+            # fmt: on
+            audio_output = ["-c:a", "aac"]
+
+        # fmt: off
+        command = [
+            "ffmpeg",
+            "-loglevel", "error",
+            "-f", "lavfi",
+            "-i", f"testsrc2=size={resolution}:rate={fps}:duration={duration}",
+            *audio_input,
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-pix_fmt", "yuv420p",
+            "-g", str(fps),
+            *audio_output,
+            path,
+        ]
+        # fmt: on
+        subprocess.run(command, check=True)
+        return path
+
+    def __get_environment(self):
+        """Describe machine results are measured on"""
+        ffmpeg_version = subprocess.run(
+            ["ffmpeg", "-version"],
+            capture_output=True,
+            text=True,
+        ).stdout.split("\n")[0]
+        return {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "ffmpeg": ffmpeg_version,
+        }
+
+    def __parse_override(self, override):
+        """Parse `NAME=VALUE` setting override"""
+        name, sep, value = override.partition("=")
+        if not sep:
+            raise CommandError(f"Invalid setting override: {override}")
+        try:
+            return name, json.loads(value)
+        except json.JSONDecodeError:
+            return name, value
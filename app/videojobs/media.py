@@ -0,0 +1,149 @@
+import json
+import subprocess
+from fractions import Fraction
+
+
+def parse_rate(rate):
+    """Parse ffprobe frame rate like `30000/1001` to float"""
+    try:
+        return float(Fraction(rate))
+    except (ValueError, ZeroDivisionError, TypeError):
+        return 0.0
+
+
+def parse_int(value):
+    """Parse ffprobe numeric string to int if present"""
+    return int(value) if value not in (None, "N/A") else None
+
+
+def probe_keyframe_times(path):
+    """
+    Get times (s) of video keyframes from packet flags, so nothing is
+    decoded. Times are relative to the first packet
+    """
+    # fmt: off
+    command = [
+        "ffprobe",
+        "-loglevel", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-print_format", "csv=print_section=0",
+        path,
+    ]
+    # fmt: on
+    result = subprocess.run(command, capture_output=True, check=True, text=True)
+    packets = [
+        (float(pts), "K" in flags)
+        for pts, flags, *_ in (line.split(",") for line in result.stdout.splitlines())
+        if pts != "N/A"
+    ]
+    start = min(pts for pts, _ in packets)
+    return sorted(pts - start for pts, is_key in packets if is_key)
+
+
+class MediaInfo:
+    """Media properties of video file read by one ffprobe call"""
+
+    def __init__(self, data):
+        # Summary made by `probe`, JSON serializable to store in DB
+        self.data = data
+
+    @classmethod
+    def probe(cls, path):
+        """Run ffprobe on file and summarize its output"""
+        # fmt: off
+        command = [
+            "ffprobe",
+            "-loglevel", "error",
+            "-print_format", "json",
+            "-show_format",
+            "-show_streams",
+            path,
+        ]
+        # fmt: on
+        result = subprocess.run(command, capture_output=True, check=True)
+        output = json.loads(result.stdout)
+        streams = output.get("streams", [])
+        container = output.get("format", {})
+
+        video = next((s for s in streams if s["codec_type"] == "video"), None)
+        audio = next((s for s in streams if s["codec_type"] == "audio"), None)
+        return cls(
+            {
+                "format": container.get("format_name"),
+                "duration": float(container.get("duration", 0)),
+                "bit_rate": parse_int(container.get("bit_rate")),
+                "streams": [
+                    {"type": s["codec_type"], "codec": s.get("codec_name")}
+                    for s in streams
+                ],
+                "video": video and cls.__summarize_video(video),
+                "audio": audio and cls.__summarize_audio(audio),
+            }
+        )
+
+    @staticmethod
+    def __summarize_video(stream):
+        fps = parse_rate(stream.get("avg_frame_rate"))
+        rotation = stream.get("tags", {}).get("rotate", 0)
+        for side_data in stream.get("side_data_list", []):
+            rotation = side_data.get("rotation", rotation)
+
+        return {
+            "codec": stream.get("codec_name"),
+            "profile": stream.get("profile"),
+            "level": stream.get("level"),
+            "pix_fmt": stream.get("pix_fmt"),
+            "width": stream.get("width"),
+            "height": stream.get("height"),
+            "fps": fps or parse_rate(stream.get("r_frame_rate")),
+            "rotation": int(rotation) % 360,
+            "bit_rate": parse_int(stream.get("bit_rate")),
+        }
+
+    @staticmethod
+    def __summarize_audio(stream):
+        return {
+            "codec": stream.get("codec_name"),
+            "sample_rate": parse_int(stream.get("sample_rate")),
+            "channels": stream.get("channels"),
+            "bit_rate": parse_int(stream.get("bit_rate")),
+        }
+
+    @property
+    def duration(self):
+        return self.data["duration"]
+
+    @property
+    def bit_rate(self):
+        return self.data["bit_rate"]
+
+    @property
+    def video(self):
+        return self.data["video"]
+
+    @property
+    def audio(self):
+        return self.data["audio"]
+
+    @property
+    def has_video(self):
+        return self.video is not None
+
+    @property
+    def has_audio(self):
+        return self.audio is not None
+
+    @property
+    def fps(self):
+        return self.video["fps"] if self.video else 0.0
+
+    @property
+    def resolution(self):
+        """Get displayed (width, height) with rotation applied"""
+        if not self.video:
+            return None
+        width, height = self.video["width"], self.video["height"]
+        if self.video["rotation"] in (90, 270):
+            return height, width
+        return width, height
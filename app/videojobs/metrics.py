@@ -0,0 +1,292 @@
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Histogram
+
+from .progress import PROGRESS_TTL
+from .utils import Singleton, get_redis, get_rss_mb
+
+# Interval (s) resident memory of running stages is sampled at
+RSS_SAMPLE_INTERVAL = 0.2
+
+STAGE_SECONDS = Histogram(
+    "videojob_stage_seconds",
+    "Wall time of videojob processing stage",
+    ["stage"],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1200, 3600),
+)
+STAGE_CPU_SECONDS = Histogram(
+    "videojob_stage_cpu_seconds",
+    "CPU time of videojob stage including its ffmpeg processes",
+    ["stage"],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1200, 3600),
+)
+STAGE_PEAK_RSS_MB = Histogram(
+    "videojob_stage_peak_rss_mb",
+    "Peak resident memory of worker with its ffmpeg processes during stage",
+    ["stage"],
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192),
+)
+STAGE_FPS = Histogram(
+    "videojob_stage_fps",
+    "Frames per second processed by videojob stage",
+    ["stage"],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+REALTIME_FACTOR = Histogram(
+    "videojob_realtime_factor",
+    "Processing time per second of video, below 1 is faster than realtime",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10),
+)
+VIDEOJOBS = Counter(
+    "videojob_completed",
+    "Videojobs completed by status",
+    ["status"],
+)
+
+
+def get_timings_key(video_id):
+    return f"videojob:{video_id}:timings"
+
+
+def get_peak_rss_key(video_id):
+    """Get sorted set of peak RSS (MB) by stage of videojob"""
+    return f"videojob:{video_id}:peak-rss"
+
+
+def get_cpu_time():
+    """
+    Get CPU time (s) of worker process with threads of ML models and its
+    finished child processes like ffmpeg
+    """
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def get_peak_rss_mb():
+    """
+    Get peak resident memory (MB) of process or any of its children over
+    their lifetime, so it's meaningful only for process running one job
+    """
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # Linux reports it in KB
+    return peak / 2**10
+
+
+def get_children_rss_mb():
+    """Get resident memory (MB) of running child processes like ffmpeg"""
+    pid = os.getpid()
+    pages = 0
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # Fields after command name which may contain spaces
+                fields = f.read().rpartition(")")[2].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            pages += int(fields[21])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def get_tree_rss_mb():
+    """Get resident memory (MB) of worker with its child processes"""
+    try:
+        return get_rss_mb() + get_children_rss_mb()
+    except OSError:
+        # No procfs, only worker memory is known
+        return get_rss_mb()
+
+
+class RssSampler(metaclass=Singleton):
+    """
+    Sample resident memory of worker with its children in background thread
+    while any stage timer is running and keep peak of each timer. Stages
+    running concurrently in one worker get the same peak
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timers = set()
+        self.pid = None
+
+    def add(self, timer):
+        """Start sampling for timer"""
+        rss = get_tree_rss_mb()
+        with self.lock:
+            timer.peak_rss = max(timer.peak_rss, rss)
+            self.timers.add(timer)
+            # Sampling thread doesn't survive fork of pool process
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                thread = threading.Thread(target=self.__sample, daemon=True)
+                thread.start()
+
+    def remove(self, timer):
+        """Stop sampling for timer taking the last sample"""
+        rss = get_tree_rss_mb()
+        with self.lock:
+            timer.peak_rss = max(timer.peak_rss, rss)
+            self.timers.discard(timer)
+
+    def __sample(self):
+        while True:
+            time.sleep(RSS_SAMPLE_INTERVAL)
+            with self.lock:
+                if not self.timers:
+                    continue
+                timers = list(self.timers)
+            rss = get_tree_rss_mb()
+            for timer in timers:
+                timer.peak_rss = max(timer.peak_rss, rss)
+
+
+def start_timings(video_id):
+    """Start timings of videojob processing over"""
+    key = get_timings_key(video_id)
+    pipe = get_redis().pipeline()
+    pipe.delete(key, get_peak_rss_key(video_id))
+    pipe.hset(key, "started_at", time.time())
+    pipe.expire(key, PROGRESS_TTL)
+    pipe.execute()
+
+
+def pop_timings(video_id, duration):
+    """
+    Get summary of wall and CPU time (s), peak RSS (MB), frames per second
+    and realtime factor of every stage of videojob and delete it from Redis
+    """
+    key = get_timings_key(video_id)
+    peak_rss_key = get_peak_rss_key(video_id)
+    pipe = get_redis().pipeline()
+    pipe.hgetall(key)
+    pipe.zrange(peak_rss_key, 0, -1, withscores=True)
+    pipe.delete(key, peak_rss_key)
+    fields, peak_rss, _ = pipe.execute()
+    fields = {k.decode(): float(v) for k, v in fields.items()}
+    peak_rss = {k.decode(): v for k, v in peak_rss}
+    if "started_at" not in fields:
+        return None
+
+    stages = {}
+    for name in (k.removesuffix(":wall") for k in fields if k.endswith(":wall")):
+        wall = fields[f"{name}:wall"]
+        frames = fields.get(f"{name}:frames", 0)
+        stages[name] = {
+            "wall": round(wall, 3),
+            "cpu": round(fields.get(f"{name}:cpu", 0), 3),
+            "peak_rss_mb": round(peak_rss.get(name, 0), 1),
+            "fps": round(frames / wall, 1) if frames and wall else None,
+            "realtime_factor": round(wall / duration, 3) if duration else None,
+        }
+
+    wall = time.time() - fields["started_at"]
+    return {
+        "wall": round(wall, 3),
+        "realtime_factor": round(wall / duration, 3) if duration else None,
+        "stages": stages,
+    }
+
+
+def observe_timings(timings, status):
+    """Export videojob timing summary as Prometheus metrics"""
+    VIDEOJOBS.labels(status).inc()
+    if timings is None:
+        return
+    for name, stage in timings["stages"].items():
+        STAGE_SECONDS.labels(name).observe(stage["wall"])
+        STAGE_CPU_SECONDS.labels(name).observe(stage["cpu"])
+        STAGE_PEAK_RSS_MB.labels(name).observe(stage["peak_rss_mb"])
+        if stage["fps"] is not None:
+            STAGE_FPS.labels(name).observe(stage["fps"])
+        if stage["realtime_factor"] is not None:
+            REALTIME_FACTOR.labels(name).observe(stage["realtime_factor"])
+    if timings["realtime_factor"] is not None:
+        REALTIME_FACTOR.labels("total").observe(timings["realtime_factor"])
+
+
+class StageTimer:
+    """
+    Measure wall time, CPU time of worker and its ffmpeg processes, and peak
+    RSS of them sampled from first start till record. Interleaved stages,
+    like detection and encoding of each frame, are measured piece by piece
+    and recorded once.
+    Measures are summed over all timers of the stage in Redis. CPU time of
+    stages running concurrently in one worker overlaps. Without `video_id`
+    nothing is recorded
+    """
+
+    def __init__(self, video_id, stage):
+        self.key = video_id and get_timings_key(video_id)
+        self.peak_rss_key = video_id and get_peak_rss_key(video_id)
+        self.stage = stage
+        self.wall = 0
+        self.cpu = 0
+        self.frames = 0
+        self.peak_rss = 0
+        self.is_sampled = False
+
+    def __enter__(self):
+        self.__start()
+        return self
+
+    def __exit__(self, *args):
+        self.__stop()
+        self.record()
+
+    @contextmanager
+    def measure(self):
+        """Measure a piece of the stage"""
+        self.__start()
+        try:
+            yield
+        finally:
+            self.__stop()
+
+    def measure_iter(self, items):
+        """Yield items measuring time taken by producing each"""
+        items = iter(items)
+        while True:
+            with self.measure():
+                item = next(items, None)
+            if item is None:
+                return
+            yield item
+
+    def record(self):
+        """Add measures to stage of videojob and reset them"""
+        if self.is_sampled:
+            RssSampler().remove(self)
+            self.is_sampled = False
+        if self.key:
+            pipe = get_redis().pipeline()
+            pipe.hincrbyfloat(self.key, f"{self.stage}:wall", self.wall)
+            pipe.hincrbyfloat(self.key, f"{self.stage}:cpu", self.cpu)
+            if self.frames:
+                pipe.hincrbyfloat(self.key, f"{self.stage}:frames", self.frames)
+            # Stage may run in several processes, the greatest peak is kept
+            pipe.zadd(self.peak_rss_key, {self.stage: self.peak_rss}, gt=True)
+            pipe.expire(self.key, PROGRESS_TTL)
+            pipe.expire(self.peak_rss_key, PROGRESS_TTL)
+            pipe.execute()
+        self.wall = self.cpu = self.frames = self.peak_rss = 0
+
+    def __start(self):
+        if self.key and not self.is_sampled:
+            RssSampler().add(self)
+            self.is_sampled = True
+        self.started_at = time.perf_counter()
+        self.cpu_started_at = get_cpu_time()
+
+    def __stop(self):
+        self.wall += time.perf_counter() - self.started_at
+        self.cpu += get_cpu_time() - self.cpu_started_at
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.9 on 2026-10-18 04:15
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videojobs", "0015_alter_videojob_output_video"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="videosetting",
+            name="detection_stride",
+            field=models.PositiveSmallIntegerField(
+                default=3,
+                help_text="Run detection on every Nth frame, 1 is exhaustive mode",
+                validators=[
+                    django.core.validators.MinValueValidator(1),
+                    django.core.validators.MaxValueValidator(10),
+                ],
+            ),
+        ),
+    ]
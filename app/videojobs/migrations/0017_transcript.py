@@ -0,0 +1,52 @@
+# Generated by Django 5.0.9 on 2026-10-18 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videojobs", "0016_videosetting_detection_stride"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Transcript",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("audio_hash", models.CharField(max_length=64)),
+                (
+                    "language",
+                    models.CharField(
+                        choices=[("en", "English"), ("ru", "Russian")], max_length=2
+                    ),
+                ),
+                ("model_id", models.CharField(max_length=100)),
+                ("words", models.JSONField()),
+                (
+                    "size",
+                    models.PositiveIntegerField(help_text="Size of words in bytes"),
+                ),
+                ("hits", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(auto_now_add=True, db_index=True),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="transcript",
+            constraint=models.UniqueConstraint(
+                fields=("audio_hash", "language", "model_id"), name="unique_transcript"
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.9 on 2026-10-18 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videojobs", "0017_transcript"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="audiosetting",
+            name="own_words",
+            field=models.TextField(
+                blank=True, help_text="Comma separated string of words or phrases"
+            ),
+        ),
+    ]
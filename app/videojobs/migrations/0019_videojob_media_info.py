@@ -0,0 +1,22 @@
+# Generated by Django 5.0.9 on 2026-10-18 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videojobs", "0018_alter_audiosetting_own_words"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="videojob",
+            name="media_info",
+            field=models.JSONField(
+                blank=True,
+                help_text="Input video properties probed at upload",
+                null=True,
+            ),
+        ),
+    ]
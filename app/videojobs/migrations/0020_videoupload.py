@@ -0,0 +1,68 @@
+# Generated by Django 5.0.9 on 2026-10-18 04:41
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+import videojobs.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videojobs", "0019_videojob_media_info"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VideoUpload",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("filename", models.CharField(max_length=255)),
+                (
+                    "input_video",
+                    models.FileField(upload_to=videojobs.models.get_input_video_path),
+                ),
+                (
+                    "size",
+                    models.PositiveBigIntegerField(help_text="Total size in bytes"),
+                ),
+                (
+                    "offset",
+                    models.PositiveBigIntegerField(
+                        default=0, help_text="Number of bytes received"
+                    ),
+                ),
+                ("job_data", models.JSONField(help_text="Validated videojob fields")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "videojob",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="videojobs.videojob",
+                    ),
+                ),
+            ],
+        ),
+    ]
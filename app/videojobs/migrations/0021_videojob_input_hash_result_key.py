@@ -0,0 +1,33 @@
+# Generated by Django 5.0.9 on 2026-10-18 04:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videojobs", "0020_videoupload"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="videojob",
+            name="input_hash",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                help_text="sha256 of input video content",
+                max_length=64,
+            ),
+        ),
+        migrations.AddField(
+            model_name="videojob",
+            name="result_key",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                help_text="Hash of input, settings and models output depends on",
+                max_length=64,
+            ),
+        ),
+    ]
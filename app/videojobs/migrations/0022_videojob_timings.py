@@ -0,0 +1,22 @@
+# Generated by Django 5.0.9 on 2026-10-18 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videojobs", "0021_videojob_input_hash_result_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="videojob",
+            name="timings",
+            field=models.JSONField(
+                blank=True,
+                help_text="Wall and CPU time, peak RSS and speed of processing stages",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.9 on 2026-10-18 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videojobs", "0022_videojob_timings"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="videojob",
+            name="status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("D", "Deferred"),
+                    ("P", "Processing"),
+                    ("C", "Completed"),
+                    ("F", "Failed"),
+                ],
+                default="P",
+                max_length=1,
+            ),
+        ),
+    ]
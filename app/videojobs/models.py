@@ -1,27 +1,34 @@
 import os
+from uuid import uuid4
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
+from .media import MediaInfo
+
 
 def get_input_video_path(_, filename):
     """Generate path for input video"""
     return os.path.join("uploads", "videos", filename)
 
 
+VALID_VIDEO_EXTENSIONS = {".mp4", ".mkv", ".avi", ".mov"}
+MAX_VIDEO_SIZE_MB = 1024
+
+
 def validate_input_video_extension(value):
     """Check does the input file have valid extension"""
     ext = os.path.splitext(value.name)[1]
-    valid_extensions = {".mp4", ".mkv", ".avi", ".mov"}
-    if ext.lower() not in valid_extensions:
+    if ext.lower() not in VALID_VIDEO_EXTENSIONS:
         raise ValidationError("Invalid file extension")
 
 
 def validate_input_video_size(value):
     """Check does the input file size exceed the limit"""
-    max_size_mb = 1024
+    max_size_mb = MAX_VIDEO_SIZE_MB
     size_mb = round(value.size // (2**20), 2)
     # Error if file size exceeds max size
     if size_mb > max_size_mb:
@@ -30,16 +37,24 @@ def validate_input_video_size(value):
 
 def get_output_video_path(instance, filename=None):
     """Generate path for output video"""
-    return os.path.join("processed_videos", instance.get_title())
+    return os.path.join("processed_videos", instance.title or instance.get_title())
+
+
+def get_censored_title(filename):
+    """Generate title of censored video from input filename"""
+    name, ext = os.path.splitext(os.path.basename(filename))
+    return name + "_censored" + ext
 
 
 class VideoJob(models.Model):
     # Status choices
+    DEFERRED = "D"
     PROCESSING = "P"
     COMPLETED = "C"
     FAILED = "F"
 
     STATUS_CHOICES = (
+        (DEFERRED, "Deferred"),
         (PROCESSING, "Processing"),
         (COMPLETED, "Completed"),
         (FAILED, "Failed"),
@@ -80,6 +95,28 @@ class VideoJob(models.Model):
         blank=True,
     )
     error_message = models.TextField(blank=True)
+    media_info = models.JSONField(
+        blank=True,
+        null=True,
+        help_text="Input video properties probed at upload",
+    )
+    input_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        help_text="sha256 of input video content",
+    )
+    result_key = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        help_text="Hash of input, settings and models output depends on",
+    )
+    timings = models.JSONField(
+        blank=True,
+        null=True,
+        help_text="Wall and CPU time, peak RSS and speed of processing stages",
+    )
     video_setting = models.ForeignKey(
         "VideoSetting",
         null=True,
@@ -100,21 +137,70 @@ class VideoJob(models.Model):
         return self.title
 
     def save(self, *args, **kwargs):
-        if not self.pk:
+        if not self.pk and not self.title:
             self.title = self.get_title()
         return super().save(*args, **kwargs)
 
+    def get_media_info(self):
+        """Get input video properties probing the file if not yet done"""
+        if self.media_info is None:
+            self.media_info = MediaInfo.probe(self.input_video.path).data
+            self.save(update_fields=["media_info"])
+        return MediaInfo(self.media_info)
+
     def get_title(self):
         """Generate videojob's title value"""
-        input_filename = os.path.basename(self.input_video.name)
-        name = os.path.splitext(input_filename)[0]
-        ext = os.path.splitext(input_filename)[1]
-        return name + "_censored" + ext
+        return get_censored_title(self.input_video.name)
+
+
+class VideoUpload(models.Model):
+    """
+    Resumable upload of input video. Chunks are written right to the final
+    path of input video, videojob is created when the last one arrives
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    user = models.ForeignKey(
+        to=get_user_model(),
+        on_delete=models.CASCADE,
+    )
+    filename = models.CharField(max_length=255)
+    input_video = models.FileField(upload_to=get_input_video_path)
+    size = models.PositiveBigIntegerField(help_text="Total size in bytes")
+    offset = models.PositiveBigIntegerField(
+        default=0,
+        help_text="Number of bytes received",
+    )
+    job_data = models.JSONField(help_text="Validated videojob fields")
+    videojob = models.OneToOneField(
+        VideoJob,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.filename
+
+    def is_complete(self):
+        """Check if all bytes are received"""
+        return self.offset == self.size
 
 
 class VideoSetting(models.Model):
+    # Run detection on every frame
+    EXHAUSTIVE_STRIDE = 1
+
     smoking = models.BooleanField(default=False, blank=True)
     gore = models.BooleanField(default=False, blank=True)
+    detection_stride = models.PositiveSmallIntegerField(
+        default=3,
+        validators=[MinValueValidator(1), MaxValueValidator(10)],
+        help_text="Run detection on every Nth frame, 1 is exhaustive mode",
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -129,18 +215,43 @@ class AudioSetting(models.Model):
     insult = models.BooleanField(default=False, blank=True)
     own_words = models.TextField(
         blank=True,
-        help_text="Comma separated string of words",
+        help_text="Comma separated string of words or phrases",
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def get_own_word_set(self):
-        """Get set of own words"""
+        """Get set of own words and phrases"""
         word_str = self.own_words.lower().strip()
-        word_list = [w for w in word_str.split(",") if w]
+        word_list = [w.strip() for w in word_str.split(",") if w.strip()]
         return set(word_list)
 
     def is_applied(self):
         """Check if any field is set"""
         return any((self.profanity, self.insult, self.own_words))
+
+
+class Transcript(models.Model):
+    """Cached transcript of video audio stream"""
+
+    audio_hash = models.CharField(max_length=64)
+    language = models.CharField(max_length=2, choices=VideoJob.LANG_CHOICES)
+    model_id = models.CharField(max_length=100)
+    words = models.JSONField()
+    size = models.PositiveIntegerField(help_text="Size of words in bytes")
+    hits = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=("audio_hash", "language", "model_id"),
+                name="unique_transcript",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.audio_hash[:12]} ({self.language}, {self.model_id})"
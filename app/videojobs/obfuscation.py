@@ -0,0 +1,58 @@
+import cv2
+
+# Blur is applied to region shrunk this many times
+BLUR_DOWNSCALE = 8
+# Blur kernel size relative to larger side of region
+BLUR_KERNEL_RATIO = 0.5
+# Number of mosaic blocks along larger side of region
+PIXELATE_BLOCKS = 10
+
+
+def blur(region):
+    """
+    Downscale region, blur it with kernel proportional to its size and
+    upscale back. Kernel grows with region, so large boxes are hidden as
+    well as small ones
+    """
+    height, width = region.shape[:2]
+    small = cv2.resize(
+        region,
+        (max(width // BLUR_DOWNSCALE, 1), max(height // BLUR_DOWNSCALE, 1)),
+        interpolation=cv2.INTER_AREA,
+    )
+    kernel = max(int(max(small.shape[:2]) * BLUR_KERNEL_RATIO) | 1, 3)
+    small = cv2.GaussianBlur(small, (kernel, kernel), 0)
+    region[:] = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def pixelate(region):
+    """Replace region with mosaic of PIXELATE_BLOCKS blocks per side"""
+    height, width = region.shape[:2]
+    block = max(max(height, width) // PIXELATE_BLOCKS, 1)
+    small = cv2.resize(
+        region,
+        (max(width // block, 1), max(height // block, 1)),
+        interpolation=cv2.INTER_AREA,
+    )
+    region[:] = cv2.resize(small, (width, height), interpolation=cv2.INTER_NEAREST)
+
+
+def fill(region):
+    """Fill region with solid black"""
+    region[:] = 0
+
+
+OBFUSCATORS = {
+    "blur": blur,
+    "pixelate": pixelate,
+    "fill": fill,
+}
+
+
+def obfuscate(frame, boxes, method):
+    """Hide frame regions of xyxy boxes in place with given method"""
+    obfuscator = OBFUSCATORS[method]
+    for x1, y1, x2, y2 in boxes.astype(int):
+        region = frame[y1:y2, x1:x2]
+        if region.size:
+            obfuscator(region)
@@ -1,6 +1,6 @@
 from rest_framework.permissions import BasePermission
 
-from subscriptions.models import Subscription
+from subscriptions.state import has_active_subscription
 
 
 class HasActiveSubscription(BasePermission):
@@ -11,6 +11,4 @@ class HasActiveSubscription(BasePermission):
     message = "No active subscription!"
 
     def has_permission(self, request, view):
-        if not Subscription.objects.filter(user=request.user, is_active=True):
-            return False
-        return True
+        return has_active_subscription(request.user.id)
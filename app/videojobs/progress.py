@@ -0,0 +1,175 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .models import VideoJob
+from .utils import get_redis
+
+# Progress of finished or abandoned videojobs expires after that (s)
+PROGRESS_TTL = 24 * 60 * 60
+
+
+def get_progress_key(video_id):
+    return f"videojob:{video_id}:progress"
+
+
+def get_progress_channel(video_id):
+    """Get pub/sub channel notified on every change of videojob progress"""
+    return f"videojob:{video_id}:progress-changed"
+
+
+def reset_progress(video_id, user_id, status):
+    """Start progress of videojob over, owner is kept to check access"""
+    key = get_progress_key(video_id)
+    pipe = get_redis().pipeline()
+    pipe.delete(key)
+    pipe.hset(key, mapping={"user_id": user_id, "status": status})
+    pipe.expire(key, PROGRESS_TTL)
+    pipe.publish(get_progress_channel(video_id), status)
+    pipe.execute()
+
+
+def set_progress_status(video_id, status):
+    """Update status of videojob in its progress"""
+    key = get_progress_key(video_id)
+    pipe = get_redis().pipeline()
+    pipe.hset(key, "status", status)
+    pipe.expire(key, PROGRESS_TTL)
+    pipe.publish(get_progress_channel(video_id), status)
+    pipe.execute()
+
+
+def start_progress_stage(video_id, stage, total):
+    """
+    Make stage current in progress of videojob. Total units and start time
+    are set by the first call for the stage, later ones keep them
+    """
+    key = get_progress_key(video_id)
+    pipe = get_redis().pipeline()
+    pipe.hsetnx(key, f"{stage}:total", total)
+    pipe.hsetnx(key, f"{stage}:started_at", time.time())
+    pipe.hset(key, "stage", stage)
+    pipe.expire(key, PROGRESS_TTL)
+    pipe.publish(get_progress_channel(video_id), stage)
+    pipe.execute()
+
+
+def get_progress(video_id):
+    """
+    Get progress of videojob with percentage, rate of units per second and
+    ETA (s) of every started stage, or None if there is no progress
+    """
+    return parse_progress(get_redis().hgetall(get_progress_key(video_id)))
+
+
+async def aget_progress(redis, video_id):
+    """Async version of `get_progress` using given asyncio Redis client"""
+    return parse_progress(await redis.hgetall(get_progress_key(video_id)))
+
+
+async def watch_progress(redis, video_id):
+    """
+    Yield progress of videojob now and on every change published to its
+    channel until it's completed or failed or PROGRESS_EVENTS_TIMEOUT
+    passes. None is yielded every PROGRESS_EVENTS_KEEPALIVE without changes
+    """
+    deadline = time.monotonic() + settings.PROGRESS_EVENTS_TIMEOUT
+    pubsub = redis.pubsub()
+    try:
+        # Subscribe before reading, so no change is missed in between
+        await pubsub.subscribe(get_progress_channel(video_id))
+        while time.monotonic() < deadline:
+            progress = await aget_progress(redis, video_id)
+            if progress is None:
+                return
+            yield progress
+            if progress["status"] in (VideoJob.COMPLETED, VideoJob.FAILED):
+                return
+
+            while time.monotonic() < deadline:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=settings.PROGRESS_EVENTS_KEEPALIVE,
+                )
+                if message:
+                    break
+                yield None
+    finally:
+        await pubsub.aclose()
+
+
+def parse_progress(fields):
+    """Build progress from its Redis hash fields"""
+    if not fields:
+        return None
+    fields = {k.decode(): v.decode() for k, v in fields.items()}
+
+    names = [k.removesuffix(":total") for k in fields if k.endswith(":total")]
+    names.sort(key=lambda name: float(fields[f"{name}:started_at"]))
+
+    stages = {}
+    for name in names:
+        total = float(fields[f"{name}:total"])
+        done = min(float(fields.get(f"{name}:done", 0)), total)
+        elapsed = time.time() - float(fields[f"{name}:started_at"])
+        rate = done / elapsed if elapsed > 0 else 0
+        stages[name] = {
+            "percent": round(done / total * 100, 1) if total else 100.0,
+            "rate": round(rate, 2),
+            "eta": round((total - done) / rate) if rate else None,
+        }
+
+    return {
+        "user_id": fields["user_id"],
+        "status": fields["status"],
+        "stage": fields.get("stage"),
+        "stages": stages,
+    }
+
+
+class ProgressReporter:
+    """
+    Report units done in a stage of videojob to its progress in Redis. Units
+    are summed over all reporters of the stage, so threads and tasks working
+    on parts of one video report together. Writes are made at most once per
+    PROGRESS_INTERVAL. Without `video_id` nothing is reported
+    """
+
+    def __init__(self, video_id, stage, total):
+        self.key = video_id and get_progress_key(video_id)
+        self.channel = video_id and get_progress_channel(video_id)
+        self.stage = stage
+        self.pending = 0
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+        if self.key:
+            start_progress_stage(video_id, stage, total)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+    def advance(self, amount=1):
+        """Add units done, they are written if interval passed"""
+        with self.lock:
+            self.pending += amount
+            if time.monotonic() - self.flushed_at < settings.PROGRESS_INTERVAL:
+                return
+            self.__write()
+
+    def flush(self):
+        """Write units done right away"""
+        with self.lock:
+            self.__write()
+
+    def __write(self):
+        if self.key and self.pending:
+            pipe = get_redis().pipeline()
+            pipe.hincrbyfloat(self.key, f"{self.stage}:done", self.pending)
+            pipe.publish(self.channel, self.stage)
+            pipe.execute()
+        self.pending = 0
+        self.flushed_at = time.monotonic()
@@ -0,0 +1,95 @@
+import hashlib
+import logging
+import threading
+import time
+from functools import cached_property
+
+from django.conf import settings
+
+from .utils import Singleton, get_rss_mb
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry(metaclass=Singleton):
+    """
+    Hold ML models loaded once per worker process. Models are loaded on
+    first request unless preloaded at worker process start
+    """
+
+    TRANSCRIBER = "transcriber"
+    DETECTOR = "detector"
+
+    def __init__(self):
+        self.__models = {}
+        # Load time (s) and resident memory growth (MB) of each model
+        self.stats = {}
+        # Censorship branches may request models from different threads
+        self.__lock = threading.Lock()
+
+    @property
+    def transcriber_id(self):
+        """Identifier of transcriber model and settings affecting its output"""
+        return f"whisper-{settings.WHISPER_MODEL_SIZE}-{settings.WHISPER_COMPUTE_TYPE}"
+
+    @cached_property
+    def detector_id(self):
+        """Identifier of detection model weights"""
+        with open(settings.DETECTION_MODEL_PATH, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()[:16]
+
+    def get_transcriber(self):
+        """Get whisper transcriber"""
+        return self.__get(self.TRANSCRIBER, self.__load_transcriber)
+
+    def get_detector(self):
+        """Get YOLO detection model"""
+        return self.__get(self.DETECTOR, self.__load_detector)
+
+    def register(self, name, model):
+        """Use given model, like a stub in benchmarks, instead of loading"""
+        with self.__lock:
+            self.__models[name] = model
+
+    def preload(self):
+        """Load all models"""
+        self.get_transcriber()
+        self.get_detector()
+
+    def __get(self, name, load):
+        """Get model by name loading it if needed"""
+        with self.__lock:
+            if name not in self.__models:
+                rss_before = get_rss_mb()
+                start = time.perf_counter()
+                self.__models[name] = load()
+                self.stats[name] = {
+                    "load_time": round(time.perf_counter() - start, 2),
+                    "memory_mb": round(get_rss_mb() - rss_before, 1),
+                }
+                logger.info(
+                    "Loaded %s in %.2fs, using %.1fMB",
+                    name,
+                    self.stats[name]["load_time"],
+                    self.stats[name]["memory_mb"],
+                )
+            return self.__models[name]
+
+    def __load_transcriber(self):
+        from .transcription import Transcriber
+
+        return Transcriber(
+            settings.WHISPER_MODEL_SIZE,
+            device="cpu",
+            compute_type=settings.WHISPER_COMPUTE_TYPE,
+            cpu_threads=settings.WHISPER_CPU_THREADS,
+            num_workers=settings.WHISPER_NUM_WORKERS,
+        )
+
+    def __load_detector(self):
+        import torch
+        from ultralytics import YOLO
+
+        if settings.DETECTION_NUM_THREADS:
+            torch.set_num_threads(settings.DETECTION_NUM_THREADS)
+        return YOLO(settings.DETECTION_MODEL_PATH)
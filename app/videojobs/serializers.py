@@ -1,8 +1,19 @@
+import os
 import re
+import subprocess
 
-from rest_framework.serializers import ModelSerializer, ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from rest_framework.serializers import (ChoiceField, ModelSerializer,
+                                        ValidationError)
 
-from .models import AudioSetting, VideoJob, VideoSetting
+from subscriptions.state import get_active_plan
+
+from .dedup import get_result_key, store_input_video
+from .limits import is_video_too_long
+from .models import (MAX_VIDEO_SIZE_MB, VALID_VIDEO_EXTENSIONS, AudioSetting,
+                     VideoJob, VideoSetting, VideoUpload, get_censored_title,
+                     get_input_video_path)
 
 
 class VideoSettingSerializer(ModelSerializer):
@@ -10,12 +21,25 @@ class VideoSettingSerializer(ModelSerializer):
 
     class Meta:
         model = VideoSetting
-        fields = ("smoking", "gore")
+        fields = ("smoking", "gore", "detection_stride")
         extra_kwargs = {
             "smoking": {"default": False},
             "gore": {"default": False},
+            "detection_stride": {"default": 3},
         }
 
+    def validate_detection_stride(self, detection_stride):
+        """Allow exhaustive detection only if user's plan includes it"""
+        if detection_stride != VideoSetting.EXHAUSTIVE_STRIDE:
+            return detection_stride
+
+        plan = get_active_plan(self.context["request"].user.id)
+        if plan is None or not plan.exhaustive_detection:
+            msg = "Exhaustive detection isn't available on your plan!"
+            raise ValidationError(msg)
+
+        return detection_stride
+
 
 class AudioSettingSerializer(ModelSerializer):
     """Audio setting serializer"""
@@ -30,18 +54,20 @@ class AudioSettingSerializer(ModelSerializer):
         }
 
     def validate_own_words(self, own_words):
-        """Check is the value a comma separated word string"""
+        """Check is the value a comma separated word or phrase string"""
         own_words = own_words.strip()
-        # The string consists at least of 1 word.
-        # Words are separated by comma.
+        # The string consists at least of 1 word or phrase.
+        # Phrases are separated by comma, words in phrase by space.
         # Word consists of letters and/or digits.
         # Words united by `-` like `co-op` are allowed
-        pattern = r"\b\w+(-\w+)*\b(,\b\w+(-\w+)*\b)*,?"
+        word = r"\w+(-\w+)*"
+        phrase = rf"{word}( {word})*"
+        pattern = rf"{phrase}(, ?{phrase})*,?"
 
         if own_words and (
             not re.fullmatch(pattern, own_words) or re.search(r"_", own_words)
         ):
-            msg = "Ensure this is a comma separated list of words!"
+            msg = "Ensure this is a comma separated list of words or phrases!"
             raise ValidationError(msg)
 
         return own_words
@@ -84,7 +110,40 @@ class VideoJobCreateSerializer(ModelSerializer):
     def create(self, validated_data):
         video_setting_data = validated_data.pop("video_setting", None)
         audio_setting_data = validated_data.pop("audio_setting", None)
-        videojob = VideoJob.objects.create(**validated_data)
+        input_video = validated_data.pop("input_video")
+        validated_data.setdefault("title", get_censored_title(input_video.name))
+        # Identical inputs are stored once under their content hash
+        with store_input_video(input_video) as (input_name, input_hash):
+            videojob = VideoJob.objects.create(
+                input_video=input_name,
+                input_hash=input_hash,
+                **validated_data,
+            )
+
+        # Probe input once, so processing stages don't spawn ffprobe again
+        try:
+            videojob.get_media_info()
+        except subprocess.CalledProcessError:
+            videojob.delete()
+            raise ValidationError({"input_video": "Unable to read the video!"})
+
+        plan = get_active_plan(videojob.user_id)
+        if is_video_too_long(plan, videojob.get_media_info()):
+            videojob.delete()
+            msg = (
+                f"The video is longer than {plan.max_video_minutes} minutes "
+                "allowed on your plan!"
+            )
+            raise ValidationError({"input_video": msg})
+
+        if (
+            video_setting_data
+            and VideoSetting(**video_setting_data).is_applied()
+            and not videojob.get_media_info().has_video
+        ):
+            videojob.delete()
+            msg = "The file has no video picture to censor!"
+            raise ValidationError({"video_setting": msg})
 
         # Get existing settings or create new
         if video_setting_data:
@@ -99,5 +158,61 @@ class VideoJobCreateSerializer(ModelSerializer):
             )
             videojob.audio_setting = audio_setting
 
+        videojob.result_key = get_result_key(videojob)
         videojob.save()
         return videojob
+
+
+class VideoUploadSerializer(ModelSerializer):
+    """
+    Serializer to start resumable upload of input video along with fields
+    of videojob created when upload is complete
+    """
+
+    language = ChoiceField(choices=VideoJob.LANG_CHOICES, write_only=True)
+    video_setting = VideoSettingSerializer(required=False, write_only=True)
+    audio_setting = AudioSettingSerializer(required=False, write_only=True)
+
+    class Meta:
+        model = VideoUpload
+        fields = (
+            "id",
+            "filename",
+            "size",
+            "offset",
+            "videojob",
+            "language",
+            "video_setting",
+            "audio_setting",
+        )
+        read_only_fields = ("id", "offset", "videojob")
+
+    def validate_filename(self, filename):
+        """Check does the file have valid extension"""
+        ext = os.path.splitext(filename)[1]
+        if ext.lower() not in VALID_VIDEO_EXTENSIONS:
+            raise ValidationError("Invalid file extension")
+        return filename
+
+    def validate_size(self, size):
+        """Check does the file size exceed the limit"""
+        if size > MAX_VIDEO_SIZE_MB * 2**20:
+            raise ValidationError(f"File size exceeds {MAX_VIDEO_SIZE_MB}MB!")
+        return size
+
+    def create(self, validated_data):
+        job_data = {
+            field: validated_data.pop(field)
+            for field in ("language", "video_setting", "audio_setting")
+            if field in validated_data
+        }
+        # Reserve final path of input video, chunks are written right there
+        input_video = default_storage.save(
+            get_input_video_path(None, os.path.basename(validated_data["filename"])),
+            ContentFile(b""),
+        )
+        return VideoUpload.objects.create(
+            input_video=input_video,
+            job_data=job_data,
+            **validated_data,
+        )
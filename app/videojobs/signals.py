@@ -1,13 +1,78 @@
+import os
+import shutil
+import threading
+
+from celery.signals import (worker_init, worker_process_init,
+                            worker_process_shutdown)
+from django.conf import settings
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
+from prometheus_client import (REGISTRY, CollectorRegistry, multiprocess,
+                               start_http_server)
 
-from .models import VideoJob
+from .admission import release_videojob
+from .dedup import delete_unreferenced_file
+from .limits import get_usage_seconds, refund_usage
+from .models import VideoJob, VideoUpload
+from .registry import ModelRegistry
 
 
 @receiver(post_delete, sender=VideoJob)
 def delete_video_files(sender, instance, **kwargs):
-    """Delete video files associated with videojob"""
-    if instance.input_video:
-        instance.input_video.delete(save=False)
-    if instance.output_video:
-        instance.output_video.delete(save=False)
+    """Delete video files associated with videojob unless shared"""
+    delete_unreferenced_file(instance.input_video)
+    delete_unreferenced_file(instance.output_video)
+
+
+@receiver(post_delete, sender=VideoJob)
+def release_admission(sender, instance, **kwargs):
+    """
+    Drop deleted videojob from admission queue or free its budget. Minutes
+    of job deleted before it started are given back to user
+    """
+    release_videojob(instance.id)
+    if instance.status == VideoJob.DEFERRED:
+        seconds = get_usage_seconds(instance.get_media_info())
+        refund_usage(instance.user_id, instance.created_at, seconds)
+
+
+@receiver(post_delete, sender=VideoUpload)
+def delete_upload_file(sender, instance, **kwargs):
+    """Delete file of upload unless it became input of videojob"""
+    delete_unreferenced_file(instance.input_video)
+
+
+@worker_process_init.connect
+def preload_models(**kwargs):
+    """
+    Load ML models once when Celery worker process starts. They load in
+    background, since pool process is killed if it doesn't report being up
+    within seconds. Tasks needing a model wait for it under registry lock
+    """
+    if settings.PRELOAD_MODELS:
+        threading.Thread(target=ModelRegistry().preload, daemon=True).start()
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    """Export Prometheus metrics of all worker processes over HTTP"""
+    if not settings.METRICS_PORT:
+        return
+
+    registry = REGISTRY
+    multiprocess_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if multiprocess_dir:
+        # Pool processes write metrics to files, values of previous worker
+        # run are dropped
+        shutil.rmtree(multiprocess_dir, ignore_errors=True)
+        os.makedirs(multiprocess_dir)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    start_http_server(settings.METRICS_PORT, registry=registry)
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    """Drop live values of exited pool process from metrics"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
@@ -1,96 +1,172 @@
+import csv
+import math
 import os
 import re
+import shutil
 import subprocess
 import sys
-from functools import lru_cache
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from uuid import uuid4
 
-import cv2
-from celery import shared_task
+import numpy as np
+from celery import chord, shared_task
+from celery.exceptions import ChordError
+from celery.result import AsyncResult
 from django.conf import settings
 from django.core.files import File
-from faster_whisper import WhisperModel
-from pydub import AudioSegment
-from pydub.generators import Sine
-from ultralytics import YOLO
-
-from .models import VideoJob
-from .utils import Singleton, UserOutputError, has_audio
-
-
-class Transcriber(
-    WhisperModel,
-    metaclass=Singleton,  # Singleton cuz WhisperModel init takes long time
-):
-    """Transcribe video/audio using whisper model"""
-
-    def transcribe_with_timestamps(self, file_path, lang):
-        """
-        Transcribe to a list of word info dictionaries with timestamps
-        included
-        """
-        segments, _ = super().transcribe(
-            file_path,
-            language=lang,
-            word_timestamps=True,
-        )
-        words = []
-        for segment in segments:
-            for w in segment.words:
-                # Merge hypenated words into 1 word, as whisper may split
-                # word like `check-in` into `check` and `-in`.
-                # NOTE: First word can't start with hyphen unless whisper
-                # makes a mistake
-                if w.word.startswith("-"):
-                    words[-1]["value"] += self.__normalize_word(w.word)
-                    continue
-                words.append(
-                    {
-                        "value": self.__normalize_word(w.word),
-                        "start": w.start,
-                        "end": w.end,
-                    }
-                )
-        return words
-
-    def __normalize_word(self, word):
-        """Bring the word to the valid format"""
-        return re.sub(r"[^\w-]", "", word.lower().strip())
+from django.db import connection
+from django.utils import timezone
+
+from subscriptions.state import get_active_plan
+
+from .admission import (admit_deferred, defer_videojob, get_admitted, is_known,
+                        release_videojob, renew_lease)
+from .audio import BLOCK_FRAMES, censor_blocks, merge_intervals
+from .banwords import BanWordMatcher
+from .caches import DetectionCache, TranscriptCache
+from .costs import estimate_videojob_cost, get_routing
+from .detection import Detector, iter_frames, iter_scaled_frames, track_boxes
+from .limits import acquire_slot, get_usage_seconds, refund_usage, release_slot
+from .media import probe_keyframe_times
+from .metrics import StageTimer, observe_timings, pop_timings, start_timings
+from .models import VideoJob, VideoUpload
+from .obfuscation import obfuscate
+from .progress import (ProgressReporter, reset_progress, set_progress_status,
+                       start_progress_stage)
+from .registry import ModelRegistry
+from .utils import UserOutputError, get_stream_hash
+
+# Time (s) admitted videojob may stay deferred before it's taken for lost
+ADMIT_TIMEOUT = 60
+
+# libx264 profiles matching h264 ones reported by ffprobe. GOPs censored in
+# copied-through video are encoded with input profile and level, so their
+# stream parameters stay compatible with copied ones
+X264_PROFILES = {
+    "Constrained Baseline": "baseline",
+    "Baseline": "baseline",
+    "Main": "main",
+    "High": "high",
+}
+
+# Put MP4 index at the front of result, so it plays before full download
+FASTSTART_OPTIONS = ["-movflags", "+faststart"]
 
 
 class VideoSoundCensor:
     """Censor unwanted words in video"""
 
-    def __init__(self, tmp_files_dir):
-        self.tmp_files_dir = tmp_files_dir
+    def __init__(self, media_info, mode=None, video_id=None):
+        self.media_info = media_info
+        self.mode = mode or settings.AUDIO_CENSOR_MODE
+        # Videojob to report progress of
+        self.video_id = video_id
 
     def censor(self, input, ban_words, lang):
-        """Censor audio track and return modified audio path"""
-        self.__raise_no_sound_error(input)
+        """Find ban words in audio track and return their time intervals"""
+        self.__raise_no_sound_error()
         self.__raise_no_ban_words_error(ban_words)
 
-        # Transcribe input file
-        model = Transcriber("medium", device="cpu", compute_type="int8")
-        words = model.transcribe_with_timestamps(input, lang)
-        # Extract audio
-        audio = AudioSegment.from_file(input)
-
-        # Apply censoring sound to detected ban words
-        for w in words:
-            if w["value"] in ban_words:
-                start_ms, end_ms = w["start"] * 1000, w["end"] * 1000
-                duration_ms = end_ms - start_ms
-                beep_sound = self.__create_beep_sound(duration_ms)
-                audio = audio[:start_ms] + beep_sound + audio[end_ms:]
-
-        # Save censored audio as temporary file
-        censored_audio_path = os.path.join(self.tmp_files_dir, f"{uuid4()}.wav")
-        audio.export(censored_audio_path, format="wav")
-        return censored_audio_path
-
-    def __raise_no_sound_error(self, video_path):
+        # Transcribe input file unless its audio was transcribed before
+        with StageTimer(self.video_id, "transcribe"):
+            cache = TranscriptCache()
+            audio_hash = get_stream_hash(input, "a")
+            model_id = ModelRegistry().transcriber_id
+            words = cache.get(audio_hash, lang, model_id)
+            if words is None:
+                words = self.__transcribe(input, lang)
+                cache.set(audio_hash, lang, model_id, words)
+
+        with StageTimer(self.video_id, "match"):
+            matches = ban_words.find([w["value"] for w in words])
+            return merge_intervals(
+                (words[first]["start"], words[last]["end"]) for first, last in matches
+            )
+
+    def get_pcm_options(self):
+        """Get ffmpeg input options of PCM streamed by `stream`"""
+        audio = self.media_info.audio
+        # fmt: off
+        return [
+            "-f", "s16le",
+            "-ar", str(audio["sample_rate"] or 48000),
+            "-ac", str(audio["channels"] or 2),
+        ]
+        # fmt: on
+
+    def stream(self, input, intervals, command):
+        """
+        Decode audio of input to PCM, censor intervals in fixed-size blocks
+        and pipe it to stdin of ffmpeg `command`. Memory use doesn't depend
+        on audio length
+        """
+        pcm_options = self.get_pcm_options()
+        frame_rate, channels = int(pcm_options[3]), int(pcm_options[5])
+        # fmt: off
+        decoder_command = [
+            "ffmpeg",
+            "-loglevel", "error",
+            "-i", input,
+            "-map", "0:a:0",
+            *pcm_options,
+            "pipe:1",
+        ]
+        # fmt: on
+        decoder = subprocess.Popen(decoder_command, stdout=subprocess.PIPE)
+        muxer = subprocess.Popen(command, stdin=subprocess.PIPE)
+        # Decoding and censoring is measured, writing to muxer is not
+        render = StageTimer(self.video_id, "audio_render")
+        try:
+            for block in render.measure_iter(
+                censor_blocks(
+                    self.__read_blocks(decoder.stdout, channels),
+                    frame_rate,
+                    intervals,
+                    self.mode,
+                )
+            ):
+                muxer.stdin.write(block.tobytes())
+        finally:
+            muxer.stdin.close()
+            muxer.wait()
+            decoder.stdout.close()
+            with render.measure():
+                decoder.wait()
+            render.record()
+
+        for process in (decoder, muxer):
+            if process.returncode:
+                raise subprocess.CalledProcessError(process.returncode, process.args)
+
+    def __read_blocks(self, pcm, channels):
+        """Read (frames, channels) int16 sample blocks from PCM pipe"""
+        frame_size = channels * 2
+        while data := pcm.read(BLOCK_FRAMES * frame_size):
+            # Drop broken frame at the end of stream if any
+            data = data[: len(data) - len(data) % frame_size]
+            yield np.frombuffer(data, np.int16).reshape(-1, channels).copy()
+
+    def __transcribe(self, input, lang):
+        """Transcribe input file to words with timestamps"""
+        model = ModelRegistry().get_transcriber()
+        with ProgressReporter(
+            self.video_id,
+            "transcription",
+            self.media_info.duration,
+        ) as progress:
+            return model.transcribe_with_timestamps(
+                input,
+                lang,
+                chunk_length=settings.TRANSCRIPTION_CHUNK_SECONDS,
+                workers=settings.WHISPER_NUM_WORKERS,
+                on_progress=progress.advance,
+            )
+
+    def __raise_no_sound_error(self):
         """Raise error if video has no sound"""
-        if not has_audio(video_path):
+        if not self.media_info.has_audio:
             raise UserOutputError(
                 "The video has no audio to apply sound censorship",
             )
@@ -100,45 +176,174 @@ class VideoSoundCensor:
         if not ban_words:
             raise ValueError("Can't collect ban words")
 
-    def __create_beep_sound(self, duration_ms):
-        """Create beep sound object"""
-        beep = Sine(1000).to_audio_segment(duration=duration_ms)
-        return beep - 20  # Reduce volume
-
 
 class VideoPictureCensor:
     """Censor unwanted classes in video"""
 
-    def __init__(self, tmp_files_dir):
+    def __init__(self, tmp_files_dir, media_info, video_id=None):
         self.tmp_files_dir = tmp_files_dir
+        self.media_info = media_info
+        # Videojob to report progress of
+        self.video_id = video_id
+
+    def censor(
+        self,
+        input,
+        ban_classes,
+        output=None,
+        audio=None,
+        stride=1,
+        output_options=(),
+    ):
+        """
+        Censor video track and return encoded video path. Frames are piped
+        as raw video into a single ffmpeg process which also muxes audio
+        stream of `audio` file if given. Detection runs on every `stride`-th
+        frame, boxes are carried over the skipped ones. `output_options` are
+        extra ffmpeg options of output
+        """
+        output = output or os.path.join(self.tmp_files_dir, f"{uuid4()}.mp4")
+        encoder = None
+
+        # Reuse detections of all classes made for this video before
+        registry = ModelRegistry()
+        cache = DetectionCache()
+        video_hash = get_stream_hash(input, "v")
+        detections = cache.get(video_hash, registry.detector_id, stride)
+        detector = Detector(registry.get_detector, ban_classes, detections)
+        progress = ProgressReporter(self.video_id, "censoring", self.__count_frames())
+        # Decoding is measured as part of detection
+        timers = [
+            detect := StageTimer(self.video_id, "detect"),
+            blur := StageTimer(self.video_id, "blur"),
+            encode := StageTimer(self.video_id, "encode"),
+        ]
 
-    def censor(self, input, ban_classes):
-        """Censor video track and return modified video path"""
-        cap = cv2.VideoCapture(input)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-        censored_video_path = os.path.join(self.tmp_files_dir, f"{uuid4()}.mp4")
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-        out = cv2.VideoWriter(censored_video_path, fourcc, fps, (width, height))
-
-        model = YOLO(settings.DETECTION_MODEL_PATH)
-
-        # Blur frames where ban classes detected
-        for frame_data in model(input, classes=ban_classes, stream=True):
-            for box in frame_data.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                frame_data.orig_img[y1:y2, x1:x2] = cv2.GaussianBlur(
-                    frame_data.orig_img[y1:y2, x1:x2], (151, 151), 0
+        try:
+            # Hide regions of frames where ban classes detected
+            for frame, boxes in detect.measure_iter(
+                track_boxes(
+                    iter_frames(input),
+                    detector,
+                    stride=stride,
+                    batch_size=settings.DETECTION_BATCH_SIZE,
+                    padding=settings.DETECTION_BOX_PADDING if stride > 1 else 0,
                 )
-            out.write(frame_data.orig_img)
-
-        # Release resources
-        cap.release()
-        out.release()
+            ):
+                with blur.measure():
+                    obfuscate(frame, boxes, settings.OBFUSCATION_METHOD)
+
+                with encode.measure():
+                    # Take frame size from decoded frame as it accounts rotation
+                    if encoder is None:
+                        height, width = frame.shape[:2]
+                        encoder = self.__open_encoder(
+                            input, output, audio, width, height, output_options
+                        )
+                    encoder.stdin.write(frame.tobytes())
+                for timer in timers:
+                    timer.frames += 1
+                progress.advance()
+        finally:
+            progress.flush()
+            if encoder:
+                with encode.measure():
+                    encoder.stdin.close()
+                    encoder.wait()
+            for timer in timers:
+                timer.record()
+
+        if encoder is None:
+            raise UserOutputError("The video has no frames to censor")
+        if encoder.returncode:
+            raise subprocess.CalledProcessError(encoder.returncode, encoder.args)
+
+        if detections is None:
+            cache.set(video_hash, registry.detector_id, stride, detector.detections)
+
+        return output
+
+    def scan(self, input, ban_classes, stride=1):
+        """
+        Find merged time ranges (s) with ban classes. Frames are decoded
+        downscaled to detection model input size, so the scan is much faster
+        than full censoring and finds the same objects
+        """
+        if self.media_info.resolution is None:
+            raise UserOutputError("The video has no frames to censor")
+        width, height = self.media_info.resolution
+        scale = min(settings.DETECTION_SCAN_SIZE / max(width, height), 1)
+        # Scaled size must be even for ffmpeg
+        width = max(int(width * scale) // 2 * 2, 2)
+        height = max(int(height * scale) // 2 * 2, 2)
+
+        # Reuse scan detections of all classes made for this video before.
+        # Boxes of downscaled frames differ from full size ones
+        registry = ModelRegistry()
+        cache = DetectionCache()
+        video_hash = get_stream_hash(input, "v")
+        model_id = f"{registry.detector_id}-scan{max(width, height)}"
+        detections = cache.get(video_hash, model_id, stride)
+        detector = Detector(registry.get_detector, ban_classes, detections)
+        hits = []
+        with ProgressReporter(
+            self.video_id,
+            "scan",
+            self.__count_frames(),
+        ) as progress, StageTimer(self.video_id, "detect") as detect:
+            for i, (_, boxes) in enumerate(
+                track_boxes(
+                    iter_scaled_frames(input, width, height),
+                    detector,
+                    stride=stride,
+                    batch_size=settings.DETECTION_BATCH_SIZE,
+                )
+            ):
+                detect.frames += 1
+                if len(boxes):
+                    fps = self.media_info.fps
+                    hits.append((i / fps, (i + 1) / fps))
+                progress.advance()
+
+        if detections is None:
+            cache.set(video_hash, model_id, stride, detector.detections)
+        return merge_intervals(hits)
+
+    def __count_frames(self):
+        """Estimate number of frames in video"""
+        return round(self.media_info.duration * self.media_info.fps)
+
+    def __open_encoder(self, input, output, audio, width, height, output_options):
+        """Start ffmpeg process encoding raw BGR frames from stdin"""
+        audio_input = []
+        audio_output = []
+        if audio:
+            # Original audio is copied, censored one is encoded
+            audio_codec = "copy" if audio == input else "aac"
+            audio_input = ["-i", audio]
+            audio_output = ["-map", "1:a:0?", "-c:a", audio_codec]
 
-        return censored_video_path
+        # fmt: off
+        command = [
+            "ffmpeg",
+            "-loglevel", "error",
+            "-f", "rawvideo",
+            "-pix_fmt", "bgr24",
+            "-video_size", f"{width}x{height}",
+            "-framerate", str(self.media_info.fps),
+            "-i", "pipe:0",
+            *audio_input,
+            "-map", "0:v:0",
+            "-c:v", "libx264",
+            # yuv420p needs even dimensions
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-pix_fmt", "yuv420p",
+            *audio_output,
+            *output_options,
+            output,
+        ]
+        # fmt: on
+        return subprocess.Popen(command, stdin=subprocess.PIPE)
 
 
 class CensorshipProcessor:
@@ -152,7 +357,10 @@ class CensorshipProcessor:
         self.video_setting = videojob.video_setting
 
         self.input_video_path = videojob.input_video.path
+        with StageTimer(videojob.id, "probe"):
+            self.media_info = videojob.get_media_info()
         self.result_path = os.path.join(tmp_files_dir, f"{uuid4()}.mp4")
+        self.intermediate_files = []
 
     def run(self):
         """
@@ -160,38 +368,286 @@ class CensorshipProcessor:
         """
         # If no settings are specified save as is
         if not self.__has_audio_setting() and not self.__has_video_setting():
-            return self.__save_video_as_is()
+            self.__save_video_as_is()
+            return self.result_path
+
+        try:
+            if self.__can_copy_through():
+                self.__censor_copy_through()
+            elif (
+                self.__has_audio_setting()
+                and self.__has_video_setting()
+                and settings.CENSOR_MAX_WORKERS > 1
+            ):
+                self.__censor_concurrently()
+            else:
+                self.__censor_sequentially()
+        finally:
+            # Clean up indermediate files
+            for path in self.intermediate_files:
+                if os.path.isfile(path):
+                    os.remove(path)
+
+        return self.result_path
+
+    def can_fan_out(self):
+        """Check is the video long enough to censor its segments in parallel"""
+        return bool(
+            settings.SEGMENT_FANOUT_MIN_SECONDS
+            and self.__has_video_setting()
+            and self.media_info.duration > settings.SEGMENT_FANOUT_MIN_SECONDS
+        )
+
+    def split(self, segments_dir=None, cut_times=None, extension="mp4"):
+        """
+        Split input video stream without re-encoding into segments cut at
+        the first keyframes after `cut_times` or every SEGMENT_SECONDS.
+        Return list of (path, start, end) of segments
+        """
+        segments_dir = segments_dir or self.tmp_files_dir
+        if cut_times is None:
+            cut_options = ["-segment_time", str(settings.SEGMENT_SECONDS)]
+        else:
+            cut_options = ["-segment_times", ",".join(map(str, cut_times))]
+
+        segment_list = os.path.join(segments_dir, "segments.csv")
+        # fmt: off
+        command = [
+            "ffmpeg",
+            "-loglevel", "error",
+            "-i", self.input_video_path,
+            "-map", "0:v:0",
+            "-c", "copy",
+            "-f", "segment",
+            *cut_options,
+            "-segment_list", segment_list,
+            "-segment_list_type", "csv",
+            "-reset_timestamps", "1",
+            os.path.join(segments_dir, f"segment_%05d.{extension}"),
+        ]
+        # fmt: on
+        with StageTimer(self.videojob.id, "mux"):
+            subprocess.run(command, check=True)
+
+        with open(segment_list) as f:
+            return [
+                (os.path.join(segments_dir, name), float(start), float(end))
+                for name, start, end in csv.reader(f)
+            ]
+
+    def censor_segment(self, segment_path, output_options=()):
+        """Apply visual censorship to segment and return censored copy path"""
+        # MPEG-TS keeps codec parameters in stream, so segments encoded
+        # differently can be joined without re-encoding
+        output = os.path.join(self.tmp_files_dir, f"{uuid4()}.ts")
+        self.intermediate_files.append(output)
+        return self.__censor_picture(
+            input=segment_path,
+            output=output,
+            output_options=output_options,
+        )
 
-        censured_audio = None
-        censured_picture = None
+    def censor_audio(self):
+        """Find ban words in audio and return their time intervals"""
+        return self.__censor_audio()
 
-        # Apply audio censorship if requested
+    def join(self, results):
+        """
+        Join censored segments into result video without re-encoding the
+        picture. Last result is audio intervals to censor if audio
+        censorship requested
+        """
+        intervals = None
+        segments = results
         if self.__has_audio_setting():
-            ban_words = self.__get_ban_words()
-            censured_audio = VideoSoundCensor(self.tmp_files_dir).censor(
-                self.input_video_path,
-                ban_words,
-                self.videojob.language,
+            *segments, intervals = results
+
+        segment_list = os.path.join(self.tmp_files_dir, f"{uuid4()}.txt")
+        self.intermediate_files.append(segment_list)
+        with open(segment_list, "w") as f:
+            f.writelines(f"file '{path}'\n" for path in segments)
+
+        self.__mux(["-f", "concat", "-safe", "0", "-i", segment_list], intervals)
+        return self.result_path
+
+    def __censor_concurrently(self):
+        """
+        Run audio and visual branches concurrently as they only share the
+        read-only input file. Picture is encoded without audio and joined
+        with censored audio streamed in the end
+        """
+        with ThreadPoolExecutor(settings.CENSOR_MAX_WORKERS) as executor:
+            audio_future = executor.submit(self.__in_thread, self.__censor_audio)
+            picture_future = executor.submit(self.__in_thread, self.__censor_picture)
+
+        self.__save_censored_video(picture_future.result(), audio_future.result())
+
+    def __in_thread(self, func):
+        """Run func in executor thread closing DB connection it opened"""
+        try:
+            return func()
+        finally:
+            connection.close()
+
+    def __censor_sequentially(self):
+        """Censor audio and then picture in the same thread"""
+        intervals = None
+        if self.__has_audio_setting():
+            intervals = self.__censor_audio()
+
+        if not self.__has_video_setting():
+            return self.__save_censored_video(None, intervals)
+
+        self.__censor_whole_picture(intervals)
+
+    def __censor_whole_picture(self, intervals):
+        """
+        Censor picture of whole video. Original audio is muxed by the picture
+        encoder in the same process, censored one is streamed afterwards
+        """
+        if intervals:
+            self.__save_censored_video(self.__censor_picture(), intervals)
+        else:
+            self.__censor_picture(
+                output=self.result_path,
+                audio=self.input_video_path,
+                output_options=FASTSTART_OPTIONS,
             )
 
-        # Apply visual censorship if requested
-        if self.__has_video_setting():
-            ban_classes = self.__get_ban_classes()
-            censured_picture = VideoPictureCensor(self.tmp_files_dir).censor(
-                self.input_video_path,
-                ban_classes,
+    def __can_copy_through(self):
+        """
+        Check if unchanged GOPs of input video can be copied to the result.
+        Censored ones are encoded to h264 yuv420p with input profile and
+        level, so input must match it. Segments lose rotation of input, so
+        rotated video is censored whole
+        """
+        video = self.media_info.video
+        return bool(
+            settings.COPY_THROUGH
+            and self.__has_video_setting()
+            and video is not None
+            and not video.get("rotation")
+            and video["codec"] == "h264"
+            and video["pix_fmt"] == "yuv420p"
+            and video.get("profile") in X264_PROFILES
+            and (video.get("level") or 0) > 0
+        )
+
+    def __get_copy_through_options(self):
+        """Get encoder options matching profile and level of input video"""
+        video = self.media_info.video
+        # fmt: off
+        return [
+            "-profile:v", X264_PROFILES[video["profile"]],
+            "-level", f"{video['level'] / 10:.1f}",
+        ]
+        # fmt: on
+
+    def __censor_copy_through(self):
+        """
+        Scan video for ban classes, re-encode only GOPs with detections and
+        copy the others into result. Audio is censored while video is scanned
+        """
+        with ThreadPoolExecutor(settings.CENSOR_MAX_WORKERS) as executor:
+            audio_future = None
+            if self.__has_audio_setting():
+                audio_future = executor.submit(self.__in_thread, self.__censor_audio)
+            scan_future = executor.submit(self.__in_thread, self.__scan_picture)
+
+        intervals = audio_future.result() if audio_future else None
+        hits = scan_future.result()
+        if not hits:
+            return self.__save_censored_video(None, intervals)
+
+        # Extend hit ranges to whole GOPs, so they can be cut out
+        with StageTimer(self.videojob.id, "probe"):
+            keyframes = probe_keyframe_times(self.input_video_path)
+        gops = merge_intervals(
+            (
+                max((k for k in keyframes if k <= start), default=0),
+                min((k for k in keyframes if k > end), default=math.inf),
             )
+            for start, end in hits
+        )
+        # Step back a bit, so rounding of times doesn't move cut to next GOP
+        cut_times = [
+            round(time - 0.001, 3)
+            for gop in gops
+            for time in gop
+            if 0 < time < math.inf
+        ]
+
+        # Detections are all over the video, nothing to copy
+        if not cut_times:
+            return self.__censor_whole_picture(intervals)
+
+        # Only frames of GOPs with detections are censored
+        start_progress_stage(
+            self.videojob.id,
+            "censoring",
+            round(
+                sum(min(e, self.media_info.duration) - s for s, e in gops)
+                * self.media_info.fps
+            ),
+        )
 
-        # Save the censured video to result path
-        self.__save_censored_video(censured_picture, censured_audio)
+        options = self.__get_copy_through_options()
+        segments_dir = os.path.join(self.tmp_files_dir, str(uuid4()))
+        os.makedirs(segments_dir)
+        try:
+            results = []
+            for path, start, end in self.split(segments_dir, cut_times, "ts"):
+                middle = (start + end) / 2
+                if any(s <= middle < e for s, e in gops):
+                    path = self.censor_segment(path, options)
+                results.append(path)
+
+            if self.__has_audio_setting():
+                results.append(intervals)
+            self.join(results)
+        finally:
+            shutil.rmtree(segments_dir, ignore_errors=True)
+
+    def __censor_audio(self):
+        """Find ban words in audio and return their time intervals"""
+        return VideoSoundCensor(
+            self.media_info,
+            video_id=self.videojob.id,
+        ).censor(
+            self.input_video_path,
+            self.__get_ban_words(),
+            self.videojob.language,
+        )
 
-        # Clean up indermediate files
-        if os.path.isfile(str(censured_audio)):
-            os.remove(censured_audio)
-        if os.path.isfile(str(censured_picture)):
-            os.remove(censured_picture)
+    def __scan_picture(self):
+        """Find time intervals of frames with ban classes"""
+        return VideoPictureCensor(
+            self.tmp_files_dir,
+            self.media_info,
+            self.videojob.id,
+        ).scan(
+            self.input_video_path,
+            self.__get_ban_classes(),
+            self.video_setting.detection_stride,
+        )
 
-        return self.result_path
+    def __censor_picture(self, input=None, output=None, audio=None, output_options=()):
+        """Apply visual censorship and return censored video path"""
+        censured_picture = VideoPictureCensor(
+            self.tmp_files_dir,
+            self.media_info,
+            self.videojob.id,
+        ).censor(
+            input or self.input_video_path,
+            self.__get_ban_classes(),
+            output,
+            audio,
+            self.video_setting.detection_stride,
+            output_options,
+        )
+        if not output:
+            self.intermediate_files.append(censured_picture)
+        return censured_picture
 
     def __has_audio_setting(self):
         return self.audio_setting and self.audio_setting.is_applied()
@@ -200,31 +656,30 @@ class CensorshipProcessor:
         return self.video_setting and self.video_setting.is_applied()
 
     def __get_ban_words(self):
-        """Collect ban words from own_words and corresponding files"""
-        ban_words = self.audio_setting.get_own_word_set()
-
-        @lru_cache(maxsize=None)
-        def pull_words_from_file(filename):
-            """Read file and return set of words"""
-            with open(filename, "r", encoding="utf8") as f:
-                return {line.strip().lower() for line in f if line.strip()}
-
+        """Compile matcher of ban words from own_words and corresponding files"""
+        filenames = []
         # Add ban words from predefined files
         if self.audio_setting.profanity:
-            profanity_file = os.path.join(
-                settings.BAN_WORDS_DIR,
-                f"profanity_{self.videojob.language}.txt",
+            filenames.append(
+                os.path.join(
+                    settings.BAN_WORDS_DIR,
+                    f"profanity_{self.videojob.language}.txt",
+                )
             )
-            ban_words.update(pull_words_from_file(profanity_file))
 
         if self.audio_setting.insult:
-            insult_file = os.path.join(
-                settings.BAN_WORDS_DIR,
-                f"insult_{self.videojob.language}.txt",
+            filenames.append(
+                os.path.join(
+                    settings.BAN_WORDS_DIR,
+                    f"insult_{self.videojob.language}.txt",
+                )
             )
-            ban_words.update(pull_words_from_file(insult_file))
 
-        return ban_words
+        return BanWordMatcher(
+            self.videojob.language,
+            phrases=self.audio_setting.get_own_word_set(),
+            filenames=filenames,
+        )
 
     def __get_ban_classes(self):
         """Collect classes to ban in video"""
@@ -243,27 +698,49 @@ class CensorshipProcessor:
             '-i', self.input_video_path,
             '-c:v', 'copy',
             '-c:a', 'copy',
+            *FASTSTART_OPTIONS,
             self.result_path,
         ]
         # fmt: on
-        subprocess.run(command)
+        with StageTimer(self.videojob.id, "mux"):
+            subprocess.run(command)
 
-    def __save_censored_video(self, censured_video, censured_audio):
+    def __save_censored_video(self, censured_video, intervals):
         """Save censored video and audio to one output file"""
-        # Merge censored parts if present
+        self.__mux(["-i", censured_video or self.input_video_path], intervals)
+
+    def __mux(self, video_input, intervals):
+        """
+        Mux video stream of `video_input` ffmpeg options with original audio
+        or audio censored in `intervals` into result. Video is already
+        encoded, censored audio is streamed through ffmpeg stdin
+        """
+        if intervals:
+            sound_censor = VideoSoundCensor(self.media_info, video_id=self.videojob.id)
+            audio_input = [*sound_censor.get_pcm_options(), "-i", "pipe:0"]
+        else:
+            audio_input = ["-i", self.input_video_path]
+
         # fmt: off
         command = [
             "ffmpeg",
-            "-i", censured_video or self.input_video_path,
-            "-i", censured_audio or self.input_video_path,
-            "-c:v", 'libx264' if censured_video else "copy",
-            "-c:a", "aac" if censured_audio else 'copy',
+            "-loglevel", "error",
+            *video_input,
+            *audio_input,
             "-map", "0:v:0",
-            *(["-map", "1:a:0"] if has_audio(self.input_video_path) else []),
+            *(["-map", "1:a:0"] if self.media_info.has_audio else []),
+            "-c:v", "copy",
+            "-c:a", "aac" if intervals else "copy",
+            *FASTSTART_OPTIONS,
             self.result_path,
         ]
         # fmt: on
-        subprocess.run(command)
+        # Streaming of censored audio is also measured as its own stage
+        with StageTimer(self.videojob.id, "mux"):
+            if intervals:
+                sound_censor.stream(self.input_video_path, intervals, command)
+            else:
+                subprocess.run(command, check=True)
 
 
 def complete_videojob(videojob, file_path, error_msg=None):
@@ -271,39 +748,260 @@ def complete_videojob(videojob, file_path, error_msg=None):
     if error_msg:
         videojob.status = videojob.FAILED
         videojob.error_message = error_msg
+        # Failed job doesn't use plan's monthly minutes
+        seconds = get_usage_seconds(videojob.get_media_info())
+        refund_usage(videojob.user_id, videojob.created_at, seconds)
     else:
         videojob.status = videojob.COMPLETED
-        with open(file_path, "rb") as f:
+        with StageTimer(videojob.id, "upload"), open(file_path, "rb") as f:
             filename = os.path.basename(file_path)
             videojob.output_video.save(filename, File(f))
         videojob.size = round(os.path.getsize(file_path) / (2**20), 2)
 
+    duration = videojob.media_info and videojob.media_info["duration"]
+    videojob.timings = pop_timings(videojob.id, duration)
     videojob.save()
+    set_progress_status(videojob.id, videojob.status)
+    observe_timings(videojob.timings, videojob.get_status_display())
+
+    # Budget and slot of the job are free for deferred ones
+    release_slot(videojob.id, videojob.user_id)
+    release_videojob(videojob.id)
+    admit_videojobs()
+
+
+def enqueue_videojob(videojob):
+    """Put video processing in Celery queue of its kind and priority"""
+    reset_progress(videojob.id, videojob.user_id, videojob.status)
+    censor_video.apply_async((videojob.id,), **get_routing(videojob))
+
+
+def defer(videojob):
+    """Put videojob in admission queue as deferred"""
+    # Status is saved first, so concurrent admission can start the job
+    VideoJob.objects.filter(id=videojob.id).update(status=VideoJob.DEFERRED)
+    videojob.status = VideoJob.DEFERRED
+    reset_progress(videojob.id, videojob.user_id, videojob.status)
+    cost = estimate_videojob_cost(videojob)
+    plan = get_active_plan(videojob.user_id)
+    max_jobs = plan and plan.max_concurrent_jobs
+    defer_videojob(videojob.id, videojob.user_id, cost, max_jobs)
+
+
+def admit_videojobs():
+    """Enqueue deferred videojobs fitting into capacity budgets"""
+    for video_id in admit_deferred():
+        # Job deleted meanwhile, or enqueued by another admission, is skipped
+        is_admitted = VideoJob.objects.filter(
+            id=video_id, status=VideoJob.DEFERRED
+        ).update(status=VideoJob.PROCESSING)
+        if is_admitted:
+            enqueue_videojob(get_videojob(video_id))
+
+
+def get_videojob(video_id):
+    """Get videojob with its settings"""
+    return VideoJob.objects.select_related(
+        "audio_setting",
+        "video_setting",
+    ).get(id=video_id)
+
+
+def get_chord_error_cause(error):
+    """
+    Get error of failed chord part which ChordError is raised for, so its
+    message to user isn't lost. ChordError itself if it can't be found
+    """
+    match = re.match(r"Dependency (\S+) raised", str(error))
+    if match is None:
+        return error
+    result = AsyncResult(match[1])
+    if result.failed() and isinstance(result.result, Exception):
+        return result.result
+    return error
+
+
+def get_error_message(error):
+    """Print error and get message to display to user"""
+    print(f"\033[91m{'ERROR'}: {str(error)}\033[0m", file=sys.stderr)
+    if isinstance(error, UserOutputError):
+        return str(error)
+    return "Unexpected error"
 
 
 @shared_task
 def censor_video(video_id):
     """Censor a video"""
-    videojob = VideoJob.objects.select_related(
-        "audio_setting",
-        "video_setting",
-    ).get(id=video_id)
+    videojob = get_videojob(video_id)
+    # Job over concurrency of user's plan goes back to queue, so jobs of
+    # other users run meanwhile
+    plan = get_active_plan(videojob.user_id)
+    if not acquire_slot(videojob.id, videojob.user_id, plan):
+        censor_video.apply_async(
+            (video_id,),
+            countdown=settings.PLAN_LIMIT_RETRY_SECONDS,
+            **get_routing(videojob),
+        )
+        return
+
+    reset_progress(videojob.id, videojob.user_id, videojob.status)
+    start_timings(videojob.id)
+    renew_lease(videojob.id)
+
+    error_msg = None
+    result_path = None
+    is_fanned_out = False
+    try:
+        # Create dir to store user's intermediate files
+        tmp_files_dir = os.path.join(settings.TMP_FILES_DIR, str(videojob.user_id))
+        os.makedirs(tmp_files_dir, exist_ok=True)
+
+        processor = CensorshipProcessor(videojob, tmp_files_dir)
+        if processor.can_fan_out():
+            fan_out_censoring(videojob)
+            is_fanned_out = True
+        else:
+            result_path = processor.run()
+    except Exception as e:
+        error_msg = get_error_message(e)
+    finally:
+        # Fanned out job is completed by its chord
+        if not is_fanned_out:
+            complete_videojob(videojob, result_path, error_msg)
+        # Clean up intermediate file
+        if result_path and os.path.isfile(result_path):
+            os.remove(result_path)
+
+
+def fan_out_censoring(videojob):
+    """
+    Split video into segments censored by parallel tasks, possibly on
+    different workers, and join them when all are done. Errors before the
+    parts are sent are raised
+    """
+    # Segments must be reachable by all workers
+    work_dir = os.path.join(settings.SHARED_TMP_FILES_DIR, str(uuid4()))
+    os.makedirs(work_dir)
+
+    try:
+        processor = CensorshipProcessor(videojob, work_dir)
+        segments = [path for path, _, _ in processor.split()]
+
+        # Parts keep priority of the job but go to queues of their kind
+        priority = get_routing(videojob)["priority"]
+        header = [
+            censor_segment.s(videojob.id, work_dir, path).set(
+                queue=settings.VISUAL_QUEUE,
+                priority=priority,
+            )
+            for path in segments
+        ]
+        if videojob.audio_setting and videojob.audio_setting.is_applied():
+            header.append(
+                censor_audio_track.s(videojob.id, work_dir).set(
+                    queue=settings.AUDIO_QUEUE,
+                    priority=priority,
+                )
+            )
+        body = (
+            join_segments.s(videojob.id, work_dir)
+            .set(priority=priority)
+            .on_error(fail_segmented_videojob.s(videojob.id, work_dir))
+        )
+        chord(header)(body)
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
 
-    # Create dir to store user's intermediate files
-    tmp_files_dir = os.path.join(settings.TMP_FILES_DIR, str(videojob.user.pk))
-    os.makedirs(tmp_files_dir, exist_ok=True)
+@shared_task
+def censor_segment(video_id, work_dir, segment_path):
+    """Censor picture of video segment"""
+    renew_lease(video_id)
+    processor = CensorshipProcessor(get_videojob(video_id), work_dir)
+    return processor.censor_segment(segment_path)
 
-    processor = CensorshipProcessor(videojob, tmp_files_dir)
+
+@shared_task
+def censor_audio_track(video_id, work_dir):
+    """Find ban words in audio of segmented video"""
+    renew_lease(video_id)
+    processor = CensorshipProcessor(get_videojob(video_id), work_dir)
+    return processor.censor_audio()
+
+
+@shared_task
+def join_segments(results, video_id, work_dir):
+    """Join censored segments and audio and complete videojob"""
+    renew_lease(video_id)
+    videojob = get_videojob(video_id)
     error_msg = None
     result_path = None
     try:
-        result_path = processor.run()
-    except UserOutputError as e:
-        error_msg = str(e)
-        print(f"\033[91m{'ERROR'}: {str(e)}\033[0m", file=sys.stderr)
+        result_path = CensorshipProcessor(videojob, work_dir).join(results)
     except Exception as e:
-        error_msg = "Unexpected error"
-        print(f"\033[91m{'ERROR'}: {str(e)}\033[0m", file=sys.stderr)
+        error_msg = get_error_message(e)
     finally:
         complete_videojob(videojob, result_path, error_msg)
-        os.remove(result_path)  # Clean up intermediate file
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@shared_task
+def fail_segmented_videojob(request, exc, traceback, video_id, work_dir):
+    """Fail videojob if any of its segment tasks failed"""
+    if isinstance(exc, ChordError):
+        exc = get_chord_error_cause(exc)
+    complete_videojob(get_videojob(video_id), None, get_error_message(exc))
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@shared_task
+def delete_expired_uploads():
+    """Delete incomplete uploads not resumed for UPLOAD_EXPIRE_HOURS"""
+    expired_at = timezone.now() - timedelta(hours=settings.UPLOAD_EXPIRE_HOURS)
+    expired_uploads = VideoUpload.objects.filter(
+        videojob=None, updated_at__lt=expired_at
+    )
+    # Deleted one by one, so signal deletes their files
+    for upload in expired_uploads:
+        upload.delete()
+
+
+def release_lost_videojobs():
+    """
+    Free budgets of admitted videojobs that are deleted or done. Ones whose
+    lease ran out, like after their worker was killed, are failed, and ones
+    left deferred by interrupted admission are deferred again
+    """
+    admitted = get_admitted()
+    statuses = dict(
+        VideoJob.objects.filter(id__in=admitted).values_list("id", "status")
+    )
+    now = time.time()
+    for video_id, lease_end in admitted.items():
+        status = statuses.get(video_id)
+        if status in (None, VideoJob.COMPLETED, VideoJob.FAILED):
+            release_videojob(video_id)
+        elif status == VideoJob.PROCESSING and lease_end < now:
+            msg = "Processing was interrupted, please try again"
+            complete_videojob(get_videojob(video_id), None, msg)
+        elif (
+            status == VideoJob.DEFERRED
+            and lease_end - settings.ADMISSION_LEASE + ADMIT_TIMEOUT < now
+        ):
+            release_videojob(video_id)
+            defer(get_videojob(video_id))
+
+
+@shared_task
+def admit_deferred_videojobs():
+    """
+    Admit deferred videojobs. Ones lost by admission queue, like on Redis
+    restart, are deferred again, and budgets of lost admitted ones are freed
+    """
+    release_lost_videojobs()
+    deferred = VideoJob.objects.filter(status=VideoJob.DEFERRED).order_by("id")
+    for videojob in deferred.select_related("audio_setting", "video_setting"):
+        if not is_known(videojob.id):
+            defer(videojob)
+    admit_videojobs()
@@ -0,0 +1,111 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from faster_whisper import WhisperModel
+from faster_whisper.audio import decode_audio
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+SAMPLE_RATE = 16000
+
+
+class Transcriber(WhisperModel):
+    """Transcribe video/audio using whisper model"""
+
+    def transcribe_with_timestamps(
+        self,
+        file_path,
+        lang,
+        chunk_length=0,
+        workers=1,
+        on_progress=None,
+    ):
+        """
+        Transcribe to a list of word info dictionaries with timestamps
+        included. If `chunk_length` (s) is set, audio is split at silence
+        into chunks of about that length transcribed by `workers` threads.
+        `on_progress` is called with seconds of audio transcribed since the
+        previous call, possibly from several threads
+        """
+        audio = decode_audio(file_path, sampling_rate=SAMPLE_RATE)
+        chunks = [(0, len(audio))]
+        if chunk_length and len(audio) > chunk_length * SAMPLE_RATE:
+            chunks = self.__split_at_silence(audio, chunk_length)
+
+        # Model releases GIL and runs `num_workers` transcriptions at once
+        with ThreadPoolExecutor(workers) as executor:
+            chunk_words = executor.map(
+                lambda chunk: self.__transcribe_chunk(audio, chunk, lang, on_progress),
+                chunks,
+            )
+
+        words = []
+        for w in (w for chunk in chunk_words for w in chunk):
+            # Merge hypenated words into 1 word, as whisper may split
+            # word like `check-in` into `check` and `-in`. Chunk seams are
+            # handled the same way.
+            # NOTE: First word can't start with hyphen unless whisper
+            # makes a mistake
+            if w.word.startswith("-") and words:
+                words[-1]["value"] += self.__normalize_word(w.word)
+                continue
+            words.append(
+                {
+                    "value": self.__normalize_word(w.word),
+                    "start": w.start,
+                    "end": w.end,
+                }
+            )
+        return words
+
+    def __transcribe_chunk(self, audio, chunk, lang, on_progress=None):
+        """Transcribe audio chunk to words with timestamps of whole audio"""
+        start, end = chunk
+        offset = start / SAMPLE_RATE
+        segments, _ = super().transcribe(
+            audio[start:end],
+            language=lang,
+            word_timestamps=True,
+        )
+
+        # Segments are transcribed lazily while iterated
+        words = []
+        transcribed = 0
+        for segment in segments:
+            words += segment.words
+            if on_progress:
+                on_progress(segment.end - transcribed)
+                transcribed = segment.end
+        if on_progress:
+            # Trailing silence has no segments
+            on_progress((end - start) / SAMPLE_RATE - transcribed)
+        return [w._replace(start=w.start + offset, end=w.end + offset) for w in words]
+
+    def __split_at_silence(self, audio, chunk_length):
+        """
+        Split audio into (start, end) sample ranges of about `chunk_length`
+        seconds cutting in the middle of silence between speech
+        """
+        max_samples = chunk_length * SAMPLE_RATE
+        speech = get_speech_timestamps(
+            audio,
+            VadOptions(
+                max_speech_duration_s=chunk_length,
+                min_silence_duration_ms=500,
+            ),
+        )
+
+        chunks = []
+        chunk_start = 0
+        prev_end = 0
+        for segment in speech:
+            if segment["end"] - chunk_start > max_samples and prev_end > chunk_start:
+                cut = (prev_end + segment["start"]) // 2
+                chunks.append((chunk_start, cut))
+                chunk_start = cut
+            prev_end = segment["end"]
+        chunks.append((chunk_start, len(audio)))
+        return chunks
+
+    def __normalize_word(self, word):
+        """Bring the word to the valid format"""
+        return re.sub(r"[^\w-]", "", word.lower().strip())
@@ -0,0 +1,49 @@
+import base64
+import hashlib
+import os
+
+from .utils import get_redis
+
+# Bytes read from request and written to file at once
+UPLOAD_BLOCK_SIZE = 2**20
+
+# Chunk lock expires if its request died without releasing it (s)
+CHUNK_LOCK_TIMEOUT = 60 * 60
+
+
+def parse_checksum(header):
+    """Parse `sha256 <base64 digest>` checksum header to digest bytes"""
+    algorithm, _, value = (header or "").partition(" ")
+    if algorithm != "sha256":
+        raise ValueError("Checksum must be sha256 digest in base64")
+    return base64.b64decode(value, validate=True)
+
+
+def get_chunk_lock(upload_id):
+    """Get Redis lock letting chunks of upload be written one at a time"""
+    return get_redis().lock(f"upload:{upload_id}:chunk", CHUNK_LOCK_TIMEOUT)
+
+
+def write_chunk(path, offset, stream, length):
+    """
+    Write `length` bytes of stream to file from offset block by block and
+    return sha256 digest of written bytes and their number. If digest or
+    length doesn't match, call `discard_chunk`
+    """
+    hasher = hashlib.sha256()
+    written = 0
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        while written < length:
+            block = stream.read(min(UPLOAD_BLOCK_SIZE, length - written))
+            if not block:
+                break
+            hasher.update(block)
+            f.write(block)
+            written += len(block)
+    return hasher.digest(), written
+
+
+def discard_chunk(path, offset):
+    """Cut off bytes written after offset"""
+    os.truncate(path, offset)
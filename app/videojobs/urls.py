@@ -1,13 +1,16 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import VideojobViewSet
+from .views import VideojobViewSet, VideoUploadViewSet, videojob_events
 
 app_name = "videojobs"
 
 router = DefaultRouter()
+# Registered first, so `uploads` isn't taken for videojob id
+router.register("uploads", VideoUploadViewSet)
 router.register("", VideojobViewSet)
 
 urlpatterns = [
+    path("<int:pk>/events/", videojob_events, name="videojob-events"),
     path("", include(router.urls)),
 ]
@@ -1,4 +1,10 @@
+import os
+import resource
 import subprocess
+from functools import lru_cache
+
+import redis
+from django.conf import settings
 
 
 class Singleton(type):
@@ -12,22 +18,48 @@ class Singleton(type):
         return Singleton._inctances[cls]
 
 
-def has_audio(video_path):
-    """Check does the video have audio stream"""
-    result = subprocess.run(
-        [
-            "ffprobe",
-            "-i",
-            video_path,
-            "-show_streams",
-            "-select_streams",
-            "a",
-            "-loglevel",
-            "error",
-        ],
-        capture_output=True,
-    )
-    return True if result.stdout else False
+def get_stream_hash(video_path, stream_type):
+    """
+    Get sha256 of packets of first audio (`a`) or video (`v`) stream, so it
+    doesn't depend on container and other streams
+    """
+    # fmt: off
+    command = [
+        "ffmpeg",
+        "-loglevel", "error",
+        "-i", video_path,
+        "-map", f"0:{stream_type}:0",
+        "-c", "copy",
+        "-f", "hash",
+        "-hash", "sha256",
+        "-",
+    ]
+    # fmt: on
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    return result.stdout.strip().split("=")[1]
+
+
+@lru_cache(maxsize=None)
+def get_redis():
+    """Get Redis client shared within process"""
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+@lru_cache(maxsize=None)
+def get_script(source):
+    """Get Lua script registered in shared Redis client"""
+    return get_redis().register_script(source)
+
+
+def get_rss_mb():
+    """Get resident memory of current process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (2**20)
+    except OSError:
+        # No procfs, fall back to peak memory which is in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
 
 
 class UserOutputError(Exception):
@@ -1,12 +1,78 @@
+import json
+import subprocess
+
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import (AuthenticationFailed, NotFound,
+                                       Throttled, ValidationError)
 from rest_framework.mixins import (CreateModelMixin, DestroyModelMixin,
                                    ListModelMixin, RetrieveModelMixin)
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from .models import VideoJob
+from subscriptions.state import get_active_plan
+from users.authentication import JWTStatelessCookieAuthentication
+
+from .admission import get_backlog_eta, get_queue_position, is_queue_full
+from .dedup import reuse_result
+from .downloads import serve_file
+from .limits import (get_month_left_seconds, get_usage_seconds,
+                     is_usage_exhausted, refund_usage, reserve_usage)
+from .media import MediaInfo
+from .models import VideoJob, VideoUpload, get_censored_title
 from .permissions import HasActiveSubscription
-from .serializers import VideoJobCreateSerializer, VideoJobReadSerializer
-from .tasks import censor_video
+from .progress import (aget_progress, get_progress, reset_progress,
+                       watch_progress)
+from .serializers import (VideoJobCreateSerializer, VideoJobReadSerializer,
+                          VideoUploadSerializer)
+from .tasks import admit_videojobs, defer
+from .uploads import discard_chunk, get_chunk_lock, parse_checksum, write_chunk
+
+MONTHLY_MINUTES_MESSAGE = "Monthly minutes of your plan are used up."
+
+
+def check_admission(user):
+    """
+    Reject new videojob of user with 429 if admission queue is full or
+    monthly minutes of user's plan are used up
+    """
+    if is_queue_full(user.id):
+        msg = "Too many videos are waiting for processing, try again later."
+        raise Throttled(get_backlog_eta(), msg)
+    if is_usage_exhausted(user.id, get_active_plan(user.id)):
+        raise Throttled(get_month_left_seconds(), MONTHLY_MINUTES_MESSAGE)
+
+
+def submit_videojob(videojob, is_reserved=False):
+    """
+    Complete videojob with the same result already made, or pass it through
+    admission control which starts it at once or defers until capacity is
+    free. Minutes of plan are reserved for it unless `is_reserved` already,
+    reused result costs none. Return queue position and ETA (s) of videojob
+    if it's deferred
+    """
+    seconds = get_usage_seconds(videojob.get_media_info())
+    if reuse_result(videojob):
+        if is_reserved:
+            refund_usage(videojob.user_id, videojob.created_at, seconds)
+        reset_progress(videojob.id, videojob.user_id, videojob.status)
+    else:
+        plan = get_active_plan(videojob.user_id)
+        if not is_reserved and not reserve_usage(videojob.user_id, plan, seconds):
+            videojob.delete()
+            raise Throttled(get_month_left_seconds(), MONTHLY_MINUTES_MESSAGE)
+        defer(videojob)
+        admit_videojobs()
+        videojob.refresh_from_db(fields=["status"])
+
+    if videojob.status == VideoJob.DEFERRED:
+        return get_queue_position(videojob.id)
+    return None
 
 
 class VideojobViewSet(
@@ -39,8 +105,252 @@ class VideojobViewSet(
         # Limit videojobs to this user
         return self.queryset.filter(user=self.request.user)
 
+    def create(self, request, *args, **kwargs):
+        check_admission(request.user)
+        response = super().create(request, *args, **kwargs)
+        # Deferred videojob is accepted with its place in admission queue
+        if self.queue_position:
+            response.data.update(self.queue_position)
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
     def perform_create(self, serializer):
         # Set this user to user field
         videojob = serializer.save(user=self.request.user)
-        # Put video processing in Celery queue
-        censor_video.delay(videojob.id)
+        self.queue_position = submit_videojob(videojob)
+
+    @action(
+        detail=True,
+        authentication_classes=[JWTStatelessCookieAuthentication],
+        permission_classes=[IsAuthenticated],
+    )
+    def progress(self, request, pk=None):
+        """
+        Get status and stage progress of videojob from Redis. Neither user
+        nor videojob is read from database, so it's cheap to poll
+        """
+        progress = get_progress(pk)
+        if progress is None or progress.pop("user_id") != str(request.user.id):
+            raise NotFound()
+        return Response(progress)
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        """Stream output video supporting byte ranges and conditional requests"""
+        videojob = self.get_object()
+        if not videojob.output_video:
+            raise NotFound("The video isn't processed yet")
+        return serve_file(request, videojob.output_video, videojob.title)
+
+
+class VideoUploadViewSet(
+    CreateModelMixin,
+    RetrieveModelMixin,
+    DestroyModelMixin,
+    GenericViewSet,
+):
+    """
+    Resumable upload of input video. POST starts upload with videojob
+    fields, PATCH appends raw chunk at `Upload-Offset` checked by
+    `Upload-Checksum: sha256 <base64>`, HEAD gets offset to resume from.
+    Videojob is created when the last chunk arrives
+    """
+
+    permission_classes = [IsAuthenticated]
+    queryset = VideoUpload.objects.all()
+    serializer_class = VideoUploadSerializer
+
+    def get_permissions(self):
+        if self.action == "create":
+            return [p() for p in self.permission_classes] + [
+                HasActiveSubscription(),
+            ]
+        return super().get_permissions()
+
+    def get_queryset(self):
+        # Limit uploads to this user
+        return self.queryset.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        return self.__with_upload_headers(response, self.get_object())
+
+    def partial_update(self, request, *args, **kwargs):
+        """Write chunk from request body and complete upload if it's last"""
+        try:
+            checksum = parse_checksum(request.headers.get("Upload-Checksum"))
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.headers["Content-Length"])
+        except (KeyError, ValueError) as e:
+            msg = f"Invalid upload headers: {e}"
+            return Response({"detail": msg}, status.HTTP_400_BAD_REQUEST)
+        if length > settings.UPLOAD_CHUNK_MAX_MB * 2**20:
+            msg = f"Chunk size exceeds {settings.UPLOAD_CHUNK_MAX_MB}MB!"
+            return Response({"detail": msg}, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        # Chunks are written one at a time under Redis lock, so no database
+        # transaction is kept open while client sends chunk
+        upload = self.get_object()
+        lock = get_chunk_lock(upload.pk)
+        if not lock.acquire(blocking=False):
+            msg = "Another chunk of this upload is being written"
+            response = Response({"detail": msg}, status.HTTP_409_CONFLICT)
+            return self.__with_upload_headers(response, upload)
+        try:
+            upload.refresh_from_db(fields=["offset"])
+            if upload.is_complete() or offset != upload.offset:
+                return self.__offset_conflict(upload)
+            if offset + length > upload.size:
+                msg = "Chunk exceeds declared upload size"
+                return Response({"detail": msg}, status.HTTP_400_BAD_REQUEST)
+            # Last chunk is rejected before it's written, so it can be resent
+            if offset + length == upload.size:
+                check_admission(request.user)
+
+            path = upload.input_video.path
+            digest, written = write_chunk(path, offset, request.stream, length)
+            if written != length or digest != checksum:
+                discard_chunk(path, offset)
+                msg = "Chunk is incomplete or doesn't match checksum"
+                response = Response({"detail": msg}, status.HTTP_400_BAD_REQUEST)
+                return self.__with_upload_headers(response, upload)
+
+            # Minutes are reserved before offset moves, so last chunk can be
+            # resent if they're used up
+            media_info = None
+            if offset + length == upload.size:
+                try:
+                    media_info = self.__reserve_usage(upload)
+                except Throttled:
+                    discard_chunk(path, offset)
+                    raise
+
+            # Offset moves only from where chunk was written, in case lock
+            # expired while it was sent
+            moved = VideoUpload.objects.filter(pk=upload.pk, offset=offset).update(
+                offset=offset + length,
+                updated_at=timezone.now(),
+            )
+            if not moved:
+                self.__refund_usage(upload, media_info)
+                upload.refresh_from_db(fields=["offset"])
+                return self.__offset_conflict(upload)
+            upload.offset = offset + length
+        finally:
+            if lock.owned():
+                lock.release()
+
+        if not upload.is_complete():
+            response = Response(status=status.HTTP_204_NO_CONTENT)
+            return self.__with_upload_headers(response, upload)
+
+        try:
+            videojob = self.__create_videojob(upload, media_info)
+        except ValidationError:
+            self.__refund_usage(upload, media_info)
+            raise
+        position = submit_videojob(videojob, is_reserved=media_info is not None)
+        response = Response(
+            VideoJobReadSerializer(videojob).data,
+            status.HTTP_201_CREATED,
+        )
+        if position:
+            response.data.update(position)
+            response.status_code = status.HTTP_202_ACCEPTED
+        return self.__with_upload_headers(response, upload)
+
+    def __reserve_usage(self, upload):
+        """
+        Probe completed upload file and reserve its minutes of user's plan.
+        None if it can't be probed, videojob isn't created of it then
+        """
+        try:
+            media_info = MediaInfo.probe(upload.input_video.path)
+        except subprocess.CalledProcessError:
+            return None
+        seconds = get_usage_seconds(media_info)
+        if not reserve_usage(upload.user_id, get_active_plan(upload.user_id), seconds):
+            raise Throttled(get_month_left_seconds(), MONTHLY_MINUTES_MESSAGE)
+        return media_info
+
+    def __refund_usage(self, upload, media_info):
+        """Give back minutes reserved for upload which made no videojob"""
+        if media_info is not None:
+            seconds = get_usage_seconds(media_info)
+            refund_usage(upload.user_id, timezone.now(), seconds)
+
+    def __create_videojob(self, upload, media_info=None):
+        """Create videojob of completed upload, probed already if media_info"""
+        serializer = VideoJobCreateSerializer(context=self.get_serializer_context())
+        videojob = serializer.create(
+            {
+                **upload.job_data,
+                "user": upload.user,
+                "input_video": upload.input_video,
+                "title": get_censored_title(upload.filename),
+                "media_info": media_info and media_info.data,
+            }
+        )
+        # Uploaded file is moved to blob store of input videos
+        upload.input_video = videojob.input_video.name
+        upload.videojob = videojob
+        upload.save(update_fields=["input_video", "videojob", "updated_at"])
+        return videojob
+
+    def __offset_conflict(self, upload):
+        msg = "Offset doesn't match uploaded size"
+        response = Response({"detail": msg}, status.HTTP_409_CONFLICT)
+        return self.__with_upload_headers(response, upload)
+
+    def __with_upload_headers(self, response, upload):
+        response["Upload-Offset"] = upload.offset
+        response["Upload-Length"] = upload.size
+        response["Cache-Control"] = "no-store"
+        return response
+
+
+async def videojob_events(request, pk):
+    """
+    Stream status and progress of videojob as server-sent events on every
+    change published by Celery tasks, instead of polling. Neither user nor
+    videojob is read from database
+    """
+    try:
+        auth = JWTStatelessCookieAuthentication().authenticate(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({"detail": e.detail}, status=401)
+    if auth is None:
+        msg = "Authentication credentials were not provided."
+        return JsonResponse({"detail": msg}, status=401)
+    user, _ = auth
+
+    redis = aioredis.Redis.from_url(settings.REDIS_URL)
+    progress = await aget_progress(redis, pk)
+    if progress is None or progress["user_id"] != str(user.id):
+        await redis.aclose()
+        return JsonResponse({"detail": "Not found."}, status=404)
+
+    response = StreamingHttpResponse(
+        stream_progress_events(redis, pk),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Don't let nginx buffer events
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def stream_progress_events(redis, video_id):
+    """Format progress changes as server-sent events"""
+    try:
+        async for progress in watch_progress(redis, video_id):
+            if progress is None:
+                yield ": keepalive\n\n"
+                continue
+            progress.pop("user_id")
+            yield f"event: progress\ndata: {json.dumps(progress)}\n\n"
+    finally:
+        await redis.aclose()